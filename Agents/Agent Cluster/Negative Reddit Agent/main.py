@@ -27,6 +27,12 @@ if not ASI_ONE_API_KEY:
 if not AGENTVERSE_API_KEY:
     raise ValueError("Please set AGENTVERSE_API_KEY environment variable")
 
+class AgentQueryError(Exception):
+    """A query that failed, and whether trying it again later could succeed."""
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
 # REST API Models
 class RedditNegativeRequest(Model):
     product_name: str
@@ -39,6 +45,10 @@ class RedditNegativeResponse(Model):
     reddit_result: str
     timestamp: str
     agent_address: str
+    # Status envelope: "ok", or "failed" with retryable saying whether trying again could help
+    status: str = "ok"
+    retryable: bool = False
+    error: str = ""
 
 # ASI:One API configuration
 ASI_BASE_URL = "https://api.asi1.ai/v1"
@@ -226,13 +236,15 @@ MOST IMPORTANT: Talk about all the negative content obtained from the reddit pos
             )
 
             if response.status_code != 200:
-                return f"ASI:One API error: {response.status_code} - {response.text}"
+                # Throttling and server errors may clear up; a rejected request would just be rejected again
+                raise AgentQueryError(f"ASI:One API error: {response.status_code} - {response.text}",
+                                      retryable=response.status_code == 429 or response.status_code >= 500)
 
             response_data = response.json()
             print(f"ASI:One response: {json.dumps(response_data, indent=2)}")
             
             if "choices" not in response_data or not response_data["choices"]:
-                return "No response received from ASI:One"
+                raise AgentQueryError("No response received from ASI:One")
 
             choice = response_data["choices"][0]["message"]
             
@@ -266,6 +278,7 @@ MOST IMPORTANT: Talk about all the negative content obtained from the reddit pos
                             print(f"🎯 Sentiment filter: {search_result.get('sentiment')}")
                         else:
                             print(f"❌ Error details: {search_result.get('error', 'Unknown error')}")
+                            raise AgentQueryError(f"Reddit search failed: {search_result.get('error', 'Unknown error')}", retryable=True)
                         
                         print(f"📋 Full search result keys: {list(search_result.keys())}")
                         
@@ -303,22 +316,25 @@ MOST IMPORTANT: Talk about all the negative content obtained from the reddit pos
                         return final_content
                     else:
                         print("❌ No choices in final response")
-                        return "No final response received from ASI:One"
+                        raise AgentQueryError("No final response received from ASI:One")
                 else:
                     print(f"❌ Final ASI:One API error: {final_response.status_code} - {final_response.text}")
-                    return f"Final ASI:One API error: {final_response.status_code} - {final_response.text}"
+                    raise AgentQueryError(f"Final ASI:One API error: {final_response.status_code} - {final_response.text}",
+                                          retryable=final_response.status_code == 429 or final_response.status_code >= 500)
             
             else:
                 print("No tool calls made by ASI:One")
                 # Return the direct response - the model has reasoned that tool usage is not needed
                 return choice.get("content", "No response content received")
 
+        except AgentQueryError:
+            raise
         except json.JSONDecodeError as e:
-            return f"JSON parsing error: {str(e)}"
+            raise AgentQueryError(f"JSON parsing error: {str(e)}")
         except requests.RequestException as e:
-            return f"Request error: {str(e)}"
+            raise AgentQueryError(f"Request error: {str(e)}")
         except Exception as e:
-            return f"Unexpected error: {str(e)}"
+            raise AgentQueryError(f"Unexpected error: {str(e)}", retryable=False)
 
 # Initialize the Reddit search agent
 reddit_search_agent = RedditSearchAgent()
@@ -411,7 +427,8 @@ async def handle_reddit_negative(ctx: Context, req: RedditNegativeRequest) -> Re
             sentiment=req.sentiment,
             reddit_result=response_text,
             timestamp=datetime.utcnow().isoformat(),
-            agent_address=ctx.agent.address
+            agent_address=ctx.agent.address,
+            status="ok"
         )
         
     except Exception as e:
@@ -424,7 +441,10 @@ async def handle_reddit_negative(ctx: Context, req: RedditNegativeRequest) -> Re
             sentiment=req.sentiment,
             reddit_result=error_msg,
             timestamp=datetime.utcnow().isoformat(),
-            agent_address=ctx.agent.address
+            agent_address=ctx.agent.address,
+            status="failed",
+            retryable=getattr(e, "retryable", False),
+            error=error_msg
         )
 
 # Include the chat protocol
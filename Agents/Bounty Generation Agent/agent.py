@@ -25,6 +25,9 @@ load_dotenv()
 ASI_ONE_API_KEY = os.environ.get("ASI_ONE_API_KEY")
 AGENTVERSE_API_KEY = os.environ.get("AGENTVERSE_API_KEY")
 
+# Orchestrator that serves the knowledge graph and waits for bounty callbacks
+ORCHESTRATOR_URL = os.environ.get("ORCHESTRATOR_URL", "https://orchestrator-739298578243.us-central1.run.app")
+
 if not ASI_ONE_API_KEY:
     raise ValueError("Please set ASI_ONE_API_KEY environment variable")
 if not AGENTVERSE_API_KEY:
@@ -115,7 +118,30 @@ class BrandRAG:
     def __init__(self, metta_instance):
         self.metta = metta_instance
         # Knowledge graph base URL
-        self.kg_base_url = "https://orchestrator-739298578243.us-central1.run.app"
+        self.kg_base_url = ORCHESTRATOR_URL
+        # Keep-alive session (requests asks for gzip by default) and the last response per URL, keyed for If-None-Match
+        self.session = requests.Session()
+        self.kg_cache = {}
+    
+    def get_kg(self, url, params=None, **kwargs):
+        """
+        GET a knowledge graph endpoint, sending the ETag from the last response so unchanged data comes back
+        as an empty 304 and is served from the local copy. Returns (status code, JSON data or error text).
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self.kg_cache.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        response = self.session.get(url, params=params, headers=headers, **kwargs)
+        print(f"📡 Response status: {response.status_code}")
+        if response.status_code == 304 and cached:
+            print(f"📦 Knowledge graph data unchanged, using cached response")
+            return 200, cached[1]
+        if response.status_code == 200:
+            data = response.json()
+            if response.headers.get("ETag"):
+                self.kg_cache[key] = (response.headers["ETag"], data)
+            return 200, data
+        return response.status_code, response.text
     
     def get_brand_summary(self, brand_name: str) -> Dict:
         """Get comprehensive brand summary from knowledge graph."""
@@ -125,11 +151,9 @@ class BrandRAG:
             print(f"🌐 Making request to: {url}")
             print(f"📤 Request params: {params}")
             
-            response = requests.get(url, params=params, timeout=30)
-            print(f"📡 Response status: {response.status_code}")
+            status_code, data = self.get_kg(url, params=params, timeout=30)
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 summary = data.get("summary", {})
                 print(f"📊 Extracted summary: {type(summary)} - {bool(summary)}")
@@ -137,7 +161,7 @@ class BrandRAG:
                     print(f"📊 Summary keys: {list(summary.keys()) if isinstance(summary, dict) else 'Not a dict'}")
                 return summary
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {data}")
             return {}
         except Exception as e:
             print(f"❌ Error getting brand summary: {e}")
@@ -469,6 +493,23 @@ def create_text_chat(text: str, end_session: bool = False) -> ChatMessage:
         content=content,
     )
 
+def notify_orchestrator(ctx: Context, brand_name: str, bounty_result: Dict):
+    """Tell the orchestrator that bounty generation for a brand has finished so it doesn't have to poll."""
+    try:
+        response = requests.post(
+            f"{ORCHESTRATOR_URL}/callbacks/bounties",
+            json={
+                "brand_name": brand_name,
+                "success": bounty_result.get("success", False),
+                "bounty_result": bounty_result,
+                "error": None if bounty_result.get("success") else bounty_result.get("analysis_summary")
+            },
+            timeout=10
+        )
+        ctx.logger.info(f"📬 Notified orchestrator about bounties for {brand_name}: {response.status_code}")
+    except Exception as e:
+        ctx.logger.error(f"❌ Error notifying orchestrator about bounties for {brand_name}: {e}")
+
 # Message Handler for receiving metrics from brand-metrics-agent
 @agent.on_message(MetricsData)
 async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
@@ -521,6 +562,9 @@ async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
                 ctx.logger.error(f"❌ Error storing bounties: {storage_error}")
                 # Continue without failing the whole process
             
+            # Let the orchestrator know right away instead of making it wait and poll
+            notify_orchestrator(ctx, msg.brand_name, bounty_result)
+            
             # Send acknowledgment with bounty generation status
             response = MetricsResponse(
                 success=True,
@@ -530,6 +574,7 @@ async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
             )
         else:
             ctx.logger.error(f"❌ Failed to auto-generate bounties for {msg.brand_name}: {bounty_result.get('analysis_summary', 'Unknown error')}")
+            notify_orchestrator(ctx, msg.brand_name, bounty_result)
             
             # Send acknowledgment with error status
             response = MetricsResponse(
@@ -541,6 +586,7 @@ async def handle_metrics_data(ctx: Context, sender: str, msg: MetricsData):
             
     except Exception as e:
         ctx.logger.error(f"❌ Error during auto-bounty generation for {msg.brand_name}: {e}")
+        notify_orchestrator(ctx, msg.brand_name, {"success": False, "analysis_summary": f"Error during auto-bounty generation: {str(e)}"})
         
         # Send acknowledgment with error status
         response = MetricsResponse(
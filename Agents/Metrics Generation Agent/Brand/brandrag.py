@@ -8,24 +8,44 @@ class BrandRAG:
         self.metta = metta_instance
         # Your ngrok URL - update this with your current ngrok URL
         self.kg_base_url = "https://orchestrator-739298578243.us-central1.run.app"
+        # Keep-alive session (requests asks for gzip by default) and the last response per URL, keyed for If-None-Match
+        self.session = requests.Session()
+        self.kg_cache = {}
+    
+    def get_kg(self, url, params=None, **kwargs):
+        """
+        GET a knowledge graph endpoint, sending the ETag from the last response so unchanged data comes back
+        as an empty 304 and is served from the local copy. Returns (status code, JSON data or error text).
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self.kg_cache.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        response = self.session.get(url, params=params, headers=headers, **kwargs)
+        print(f"📡 Response status: {response.status_code}")
+        if response.status_code == 304 and cached:
+            print(f"📦 Knowledge graph data unchanged, using cached response")
+            return 200, cached[1]
+        if response.status_code == 200:
+            data = response.json()
+            if response.headers.get("ETag"):
+                self.kg_cache[key] = (response.headers["ETag"], data)
+            return 200, data
+        return response.status_code, response.text
     
     def get_all_brands(self) -> List[str]:
         """Get all brands available in the knowledge graph."""
         try:
             url = f"{self.kg_base_url}/kg/get_all_brands"
             print(f"🌐 Making request to: {url}")
-            response = requests.get(url)
-            print(f"📡 Response status: {response.status_code}")
-            print(f"📡 Response headers: {dict(response.headers)}")
+            status_code, data = self.get_kg(url)
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 brands = data.get("brands", [])
                 print(f"📊 Extracted brands: {brands}")
                 return brands
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {data}")
             return []
         except Exception as e:
             print(f"❌ Error fetching brands: {e}")
@@ -44,11 +64,9 @@ class BrandRAG:
             print(f"🌐 Making request to: {url}")
             print(f"📤 Request params: {params}")
             
-            response = requests.get(url, params=params)
-            print(f"📡 Response status: {response.status_code}")
+            status_code, data = self.get_kg(url, params=params)
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 results = data.get("results", [])
                 print(f"📊 Extracted results: {len(results)} items")
@@ -56,7 +74,7 @@ class BrandRAG:
                     print(f"📊 Sample result: {results[0][:100]}..." if len(results[0]) > 100 else f"📊 Sample result: {results[0]}")
                 return results
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {data}")
             return []
         except Exception as e:
             print(f"❌ Error querying brand data: {e}")
@@ -70,11 +88,9 @@ class BrandRAG:
             print(f"🌐 Making request to: {url}")
             print(f"📤 Request params: {params}")
             
-            response = requests.get(url, params=params)
-            print(f"📡 Response status: {response.status_code}")
+            status_code, data = self.get_kg(url, params=params)
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 print(f"📊 Response data: {data}")
                 summary = data.get("summary", {})
                 print(f"📊 Extracted summary: {type(summary)} - {bool(summary)}")
@@ -82,7 +98,7 @@ class BrandRAG:
                     print(f"📊 Summary keys: {list(summary.keys()) if isinstance(summary, dict) else 'Not a dict'}")
                 return summary
             else:
-                print(f"❌ Error response: {response.text}")
+                print(f"❌ Error response: {data}")
             return {}
         except Exception as e:
             print(f"❌ Error getting brand summary: {e}")
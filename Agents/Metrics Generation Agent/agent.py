@@ -129,6 +129,10 @@ class BrandMetricsResponse(Model):
     metrics: Dict
     timestamp: str
     agent_address: str
+    # Status envelope: "ok", or "failed" with retryable saying whether trying again could help
+    status: str = "ok"
+    retryable: bool = False
+    error: str = ""
 
 async def send_metrics_to_bounty_agent(ctx: Context, brand_name: str, brand_summary: Dict):
     """Send brand metrics data to the bounty agent via A2A communication."""
@@ -660,6 +664,20 @@ async def handle_brand_metrics(ctx: Context, req: BrandMetricsRequest) -> BrandM
             # Generate comprehensive metrics using LLM
             metrics = generate_brand_metrics(req.brand_name, brand_summary, llm)
             
+            if "error" in metrics:
+                # The LLM call or its JSON failed; another attempt may well work
+                ctx.logger.error(f"Metrics generation failed for {req.brand_name}: {metrics['error']}")
+                return BrandMetricsResponse(
+                    success=False,
+                    brand_name=req.brand_name,
+                    metrics={},
+                    timestamp=datetime.now(timezone.utc).isoformat(),
+                    agent_address=ctx.agent.address,
+                    status="failed",
+                    retryable=True,
+                    error=metrics["error"]
+                )
+            
             # Store the metrics data globally for the last metrics endpoint
             global last_metrics_data, last_brand_name
             last_metrics_data = metrics
@@ -673,15 +691,20 @@ async def handle_brand_metrics(ctx: Context, req: BrandMetricsRequest) -> BrandM
                 brand_name=req.brand_name,
                 metrics=metrics,
                 timestamp=datetime.now(timezone.utc).isoformat(),
-                agent_address=ctx.agent.address
+                agent_address=ctx.agent.address,
+                status="ok"
             )
         else:
+            # Nothing in the knowledge graph yet; worth asking again once the collectors have stored data
             return BrandMetricsResponse(
                 success=False,
                 brand_name=req.brand_name,
                 metrics={},
                 timestamp=datetime.now(timezone.utc).isoformat(),
-                agent_address=ctx.agent.address
+                agent_address=ctx.agent.address,
+                status="failed",
+                retryable=True,
+                error=f"No knowledge graph data for {req.brand_name}"
             )
         
     except Exception as e:
@@ -693,7 +716,10 @@ async def handle_brand_metrics(ctx: Context, req: BrandMetricsRequest) -> BrandM
             brand_name=req.brand_name,
             metrics={},
             timestamp=datetime.now(timezone.utc).isoformat(),
-            agent_address=ctx.agent.address
+            agent_address=ctx.agent.address,
+            status="failed",
+            retryable=True,
+            error=error_msg
         )
 
 # Include the chat protocol
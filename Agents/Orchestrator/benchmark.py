@@ -0,0 +1,274 @@
+"""
+End-to-end throughput benchmark for the orchestrator.
+
+Drives POST /research-brand?wait=true at increasing concurrency and, per level, records p50/p95/p99 latency,
+throughput, knowledge graph and process memory growth, and event-loop lag (scraped from /metrics).
+Requests turned away with 429 because the job queue is full are retried after Retry-After and counted separately.
+Writes a JSON report plus a markdown table, and can compare against an earlier report to catch regressions.
+
+    # start the stand-in agents and an orchestrator pointed at them, then benchmark
+    python benchmark.py --spawn --latency-scale 0.1 --concurrency 1 4 16 --brands-per-level 32
+
+    # compare with a previous run; exits 1 if p95 or throughput regressed by more than --tolerance
+    python benchmark.py --spawn --baseline benchmark_results/baseline.json
+"""
+from prometheus_client.parser import text_string_to_metric_families
+from datetime import datetime, timezone
+import subprocess
+import argparse
+import asyncio
+import httpx
+import time
+import json
+import math
+import sys
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def brand_label(n):
+    """Spell a number in letters, so generated brand names read like words."""
+    label = ""
+    while True:
+        n, digit = divmod(n, 26)
+        label = chr(ord("a") + digit) + label
+        if n == 0:
+            return label
+        n -= 1
+
+def percentile(values, p):
+    """Nearest-rank percentile, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+async def scrape_metrics(client, base_url):
+    """Fetch /metrics and flatten it into {(sample name, sorted label items): value}."""
+    response = await client.get(f"{base_url}/metrics")
+    response.raise_for_status()
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+def sample_delta(before, after, name):
+    return after.get((name, ()), 0) - before.get((name, ()), 0)
+
+def histogram_quantile(before, after, name, q):
+    """Estimate a quantile of what a histogram observed between two scrapes, as the upper bound of its bucket."""
+    buckets = []
+    for (sample_name, labels), value in after.items():
+        if sample_name == f"{name}_bucket":
+            le = float(dict(labels)["le"])
+            buckets.append((le, value - before.get((sample_name, labels), 0)))
+    buckets.sort()
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    for le, count in buckets:
+        if count >= q * buckets[-1][1]:
+            return le
+    return buckets[-1][0]
+
+async def research_one(client, base_url, brand_name, max_rejections):
+    """
+    Research one brand and return (latency seconds, HTTP status, times rejected). A full queue answers 429,
+    so wait for its Retry-After and try again; the latency includes those waits.
+    """
+    started = time.monotonic()
+    rejections = 0
+    while True:
+        try:
+            response = await client.post(
+                f"{base_url}/research-brand",
+                params={"wait": "true"},
+                json={"brand_name": brand_name, "use_cache": False}
+            )
+            status = response.status_code
+        except httpx.HTTPError as e:
+            print(f"❌ {brand_name}: {type(e).__name__}: {e}")
+            status = 0
+        if status != 429 or rejections >= max_rejections:
+            return time.monotonic() - started, status, rejections
+        rejections += 1
+        await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+async def run_level(client, base_url, concurrency, brands, run_tag, level_index, max_rejections):
+    """Research `brands` distinct brands with at most `concurrency` requests in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i):
+        async with semaphore:
+            return await research_one(client, base_url, f"bench {run_tag} {brand_label(level_index)} {brand_label(i)}", max_rejections)
+
+    before = await scrape_metrics(client, base_url)
+    started = time.monotonic()
+    results = await asyncio.gather(*(bounded(i) for i in range(brands)))
+    elapsed = time.monotonic() - started
+    after = await scrape_metrics(client, base_url)
+
+    latencies = [latency for latency, status, rejections in results if status == 200]
+    errors = sum(1 for latency, status, rejections in results if status != 200)
+    lag_count = sample_delta(before, after, "orchestrator_event_loop_lag_seconds_count")
+    lag_sum = sample_delta(before, after, "orchestrator_event_loop_lag_seconds_sum")
+    kg_atoms_added = sample_delta(before, after, "orchestrator_kg_atoms")
+    rss_growth = sample_delta(before, after, "process_resident_memory_bytes")
+    return {
+        "concurrency": concurrency,
+        "requests": brands,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "rejected": sum(rejections for latency, status, rejections in results),
+        "elapsed_seconds": round(elapsed, 2),
+        "brands_per_hour": round(len(latencies) / elapsed * 3600, 1) if elapsed else 0,
+        "latency_p50_seconds": percentile(latencies, 50),
+        "latency_p95_seconds": percentile(latencies, 95),
+        "latency_p99_seconds": percentile(latencies, 99),
+        "event_loop_lag_mean_seconds": round(lag_sum / lag_count, 4) if lag_count else None,
+        "event_loop_lag_p99_seconds": histogram_quantile(before, after, "orchestrator_event_loop_lag_seconds", 0.99),
+        "kg_atoms_added": kg_atoms_added,
+        "kg_atoms_total": after.get(("orchestrator_kg_atoms", ()), 0),
+        "rss_growth_bytes": rss_growth,
+        "rss_growth_bytes_per_brand": round(rss_growth / len(latencies)) if latencies else None,
+        "rss_bytes": after.get(("process_resident_memory_bytes", ()), 0),
+    }
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.3f}"
+
+def markdown_report(report):
+    lines = [
+        f"# Orchestrator benchmark ({report['run_at']})",
+        "",
+        f"Orchestrator: {report['orchestrator_url']}, {report['brands_per_level']} brands per level",
+        "",
+        "| Concurrency | OK | Errors | 429 retries | Brands/hour | p50 s | p95 s | p99 s | Loop lag mean s | Loop lag p99 s | KG atoms added | RSS growth MB |",
+        "|---|---|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for level in report["levels"]:
+        lines.append(
+            f"| {level['concurrency']} | {level['succeeded']} | {level['errors']} | {level.get('rejected', 0)} | {level['brands_per_hour']} "
+            f"| {format_seconds(level['latency_p50_seconds'])} | {format_seconds(level['latency_p95_seconds'])} "
+            f"| {format_seconds(level['latency_p99_seconds'])} | {format_seconds(level['event_loop_lag_mean_seconds'])} "
+            f"| {format_seconds(level['event_loop_lag_p99_seconds'])} | {level['kg_atoms_added']:.0f} "
+            f"| {level['rss_growth_bytes'] / 1e6:.1f} |"
+        )
+    return "\n".join(lines) + "\n"
+
+def compare_with_baseline(report, baseline, tolerance):
+    """Return a list of regressions against a baseline report, matching levels by concurrency."""
+    regressions = []
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in report["levels"]:
+        previous = baseline_levels.get(level["concurrency"])
+        if previous is None:
+            continue
+        if previous["latency_p95_seconds"] and level["latency_p95_seconds"] is not None:
+            change = level["latency_p95_seconds"] / previous["latency_p95_seconds"] - 1
+            if change > tolerance:
+                regressions.append(f"concurrency {level['concurrency']}: p95 latency up {change:.0%} "
+                                   f"({previous['latency_p95_seconds']:.3f}s -> {level['latency_p95_seconds']:.3f}s)")
+        if previous["brands_per_hour"]:
+            change = 1 - level["brands_per_hour"] / previous["brands_per_hour"]
+            if change > tolerance:
+                regressions.append(f"concurrency {level['concurrency']}: throughput down {change:.0%} "
+                                   f"({previous['brands_per_hour']} -> {level['brands_per_hour']} brands/hour)")
+    return regressions
+
+async def wait_until_up(client, url, timeout_seconds=60):
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout_seconds} seconds")
+
+def spawn_services(args):
+    """Start the stand-in agents and an orchestrator that uses them."""
+    env = {
+        **os.environ,
+        "AGENT_REGISTRY_PATH": "agents.local.json",
+        "STAND_IN_LATENCY_SCALE": str(args.latency_scale),
+        "ORCHESTRATOR_URL": args.orchestrator_url,
+    }
+    if args.seed is not None:
+        env["STAND_IN_SEED"] = str(args.seed)
+    stand_ins = subprocess.Popen([sys.executable, "stand_in_agents.py"], cwd=HERE, env=env)
+    orchestrator = subprocess.Popen([sys.executable, "main.py"], cwd=HERE, env=env)
+    return [stand_ins, orchestrator]
+
+async def run_benchmark(args):
+    processes = spawn_services(args) if args.spawn else []
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+        async with httpx.AsyncClient(timeout=httpx.Timeout(args.request_timeout, connect=10), limits=limits) as client:
+            await wait_until_up(client, f"{args.orchestrator_url}/health")
+            run_tag = brand_label(int(time.time()))
+            levels = []
+            for index, concurrency in enumerate(args.concurrency):
+                print(f"🏋️ Concurrency {concurrency}: researching {args.brands_per_level} brands...")
+                level = await run_level(client, args.orchestrator_url, concurrency, args.brands_per_level, run_tag, index,
+                                        args.max_rejections)
+                print(f"   {level['brands_per_hour']} brands/hour, p95 {format_seconds(level['latency_p95_seconds'])}s, "
+                      f"{level['errors']} errors, {level['rejected']} rejected with 429 and retried")
+                if level["rejected"]:
+                    print(f"   ⚠️ Latencies include Retry-After waits; run the orchestrator with "
+                          f"MAX_QUEUED_JOBS >= {concurrency} to measure this level without queue rejections")
+                levels.append(level)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    return {
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "orchestrator_url": args.orchestrator_url,
+        "brands_per_level": args.brands_per_level,
+        "latency_scale": args.latency_scale if args.spawn else None,
+        "levels": levels,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark orchestrator throughput and tail latency.")
+    parser.add_argument("--orchestrator-url", default="http://localhost:8080")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--brands-per-level", type=int, default=32)
+    parser.add_argument("--request-timeout", type=float, default=1800)
+    parser.add_argument("--max-rejections", type=int, default=100,
+                        help="429s to wait out per brand before counting it as an error")
+    parser.add_argument("--spawn", action="store_true", help="start stand_in_agents.py and main.py before benchmarking")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="STAND_IN_LATENCY_SCALE for spawned stand-ins")
+    parser.add_argument("--seed", type=int, help="STAND_IN_SEED for spawned stand-ins")
+    parser.add_argument("--report", default=os.path.join(HERE, "benchmark_results", "latest.json"))
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed p95/throughput regression, e.g. 0.1 for 10%%")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    markdown = markdown_report(report)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.splitext(args.report)[0] + ".md", "w") as f:
+        f.write(markdown)
+    print(markdown)
+    print(f"📝 Report written to {args.report}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,55 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import httpx
 import asyncio
-from datetime import datetime
-from hyperon import MeTTa, E, S, ValueAtom
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+from uuid import uuid4
+from contextlib import asynccontextmanager, nullcontext
+from collections import OrderedDict, deque
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 import threading
+import math
+import hashlib
+import orjson
+import gzip
+import sqlite3
+import heapq
 import time
-# from pyngrok import ngrok
+import os
+import random
+import json
+@asynccontextmanager
+async def lifespan(app):
+    """Create the shared HTTP client and start the research worker pool; tear both down on shutdown."""
+    global http_client
+    http_client = create_http_client()
+    workers = [asyncio.create_task(research_worker(i)) for i in range(RESEARCH_WORKERS)]
+    workers.append(asyncio.create_task(monitor_event_loop_lag()))
+    resume_checkpointed_jobs()
+    print_banner()
+    if SCHEDULER_ENABLED:
+        workers.append(asyncio.create_task(run_scheduler()))
+    print(f"👷 Started {RESEARCH_WORKERS} research workers (HTTP/2: {HTTP2_ENABLED}, max connections: {HTTP_MAX_CONNECTIONS})")
+    yield
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await http_client.aclose()
 
-# Set ngrok authtoken
-# ngrok.set_auth_token("2kEGVmoK5L1A7fSTRJ6k4n7YMkl_3jBZXFdHfibFjz6fh9LAN")
-
-app = FastAPI(title="Brand Research Orchestrator with Knowledge Graph", version="1.0.0")
+app = FastAPI(title="Brand Research Orchestrator with Knowledge Graph", version="1.0.0", lifespan=lifespan)
 
 class BrandRequest(BaseModel):
     brand_name: str
+    use_cache: bool = True
+    # Re-run only the sources whose knowledge graph copy is older than the agent's cache_ttl_seconds
+    refresh: bool = False
+    # Answer with whatever stages have finished after this many seconds instead of waiting for all of them
+    deadline_seconds: Optional[float] = None
 
 class OrchestratorResponse(BaseModel):
     brand_name: str
@@ -29,10 +64,52 @@ class OrchestratorResponse(BaseModel):
     bounty_result: str
     timestamp: str
     kg_storage_status: str
+    job_id: Optional[str] = None
+    partial: bool = False
+    missing_stages: List[str] = []
+    failed_stages: Dict[str, str] = {}
+
+class BatchResearchRequest(BaseModel):
+    brand_names: List[str]
+    use_cache: bool = True
+    refresh: bool = False
+
+class JobSubmission(BaseModel):
+    job_id: str
+    brand_name: str
+    status: str
+    status_url: str
+    coalesced: bool = False
+
+class JobStatus(BaseModel):
+    job_id: str
+    brand_name: str
+    status: str
+    stages_completed: List[str]
+    partial_results: Dict[str, str]
+    result: Optional[OrchestratorResponse] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class BountyCallback(BaseModel):
+    brand_name: str
+    success: bool
+    bounty_result: Dict[str, Any] = {}
+    error: Optional[str] = None
 
 class BrandKnowledgeGraph:
     def __init__(self):
         self.metta = MeTTa()
+        # Atoms stored per (brand_id, data key), so re-researching a brand replaces its data instead of piling up
+        self.brand_atoms = {}
+        # When each (brand_id, data key) was last written
+        self.updated_at = {}
+        # Data versions, bumped on every write, so KG query responses can be revalidated with ETags
+        self.instance_id = uuid4().hex
+        self.version = 0
+        self.brand_versions = {}
         self.initialize_schema()
     
     def initialize_schema(self):
@@ -51,53 +128,108 @@ class BrandKnowledgeGraph:
         self.metta.space().add_atom(E(S("has_sentiment"), S("social_comments"), S("positive")))
         self.metta.space().add_atom(E(S("has_sentiment"), S("social_comments"), S("negative")))
     
+    def replace_atoms(self, brand_id, key, atoms):
+        """Store atoms for one piece of brand data, removing whatever was stored for it before."""
+        space = self.metta.space()
+        for atom in self.brand_atoms.get((brand_id, key), []):
+            space.remove_atom(atom)
+        for atom in atoms:
+            space.add_atom(atom)
+        self.brand_atoms[(brand_id, key)] = atoms
+        self.updated_at[(brand_id, key)] = datetime.now(timezone.utc)
+        self.version += 1
+        self.brand_versions[brand_id] = self.version
+    
+    def restore_atoms(self, brand_id, key, atoms, updated_at):
+        """Put back atoms saved from brand_atoms (none means the data wasn't stored), e.g. to undo a cancelled job's write."""
+        space = self.metta.space()
+        for atom in self.brand_atoms.pop((brand_id, key), []):
+            space.remove_atom(atom)
+        self.updated_at.pop((brand_id, key), None)
+        for atom in atoms:
+            space.add_atom(atom)
+        if atoms:
+            self.brand_atoms[(brand_id, key)] = atoms
+            self.updated_at[(brand_id, key)] = updated_at
+        self.version += 1
+        self.brand_versions[brand_id] = self.version
+    
+    def get_source(self, brand_name, key):
+        """Return (value, updated_at) for one stored source of a brand, or (None, None) if it was never stored."""
+        brand_id = brand_name.lower().replace(" ", "_")
+        atoms = self.brand_atoms.get((brand_id, key))
+        if not atoms:
+            return None, None
+        # The first atom of every source holds its text as (<relation> <id> <value>)
+        return atoms[0].get_children()[2].get_object().value, self.updated_at[(brand_id, key)]
+    
+    def get_source_freshness(self, brand_name):
+        """When each stored source of a brand was last updated."""
+        brand_id = brand_name.lower().replace(" ", "_")
+        return {key: updated_at.isoformat() for (stored_id, key), updated_at in self.updated_at.items()
+                if stored_id == brand_id and key != 'brand_name'}
+    
     def add_brand_data(self, brand_name, data):
-        """Add comprehensive brand data to the knowledge graph."""
+        """Add comprehensive brand data to the knowledge graph, replacing earlier data for the same sources."""
         brand_id = brand_name.lower().replace(" ", "_")
         
         # Add brand name
-        self.metta.space().add_atom(E(S("brand_name"), S(brand_id), ValueAtom(brand_name)))
+        self.replace_atoms(brand_id, 'brand_name', [E(S("brand_name"), S(brand_id), ValueAtom(brand_name))])
         
         # Add web results (single string)
         if 'web_results' in data and data['web_results']:
-            self.metta.space().add_atom(E(S("web_result"), S(brand_id), ValueAtom(data['web_results'])))
-            self.metta.space().add_atom(E(S("brand_has_web"), S(brand_id), S(brand_id)))
+            self.replace_atoms(brand_id, 'web_results', [
+                E(S("web_result"), S(brand_id), ValueAtom(data['web_results'])),
+                E(S("brand_has_web"), S(brand_id), S(brand_id))
+            ])
         
         # Add positive reddit threads (single string)
         if 'positive_reddit' in data and data['positive_reddit']:
-            self.metta.space().add_atom(E(S("reddit_thread"), S(f"{brand_id}_pos"), ValueAtom(data['positive_reddit'])))
-            self.metta.space().add_atom(E(S("brand_has_reddit"), S(brand_id), S(f"{brand_id}_pos")))
-            self.metta.space().add_atom(E(S("thread_sentiment"), S(f"{brand_id}_pos"), S("positive")))
+            self.replace_atoms(brand_id, 'positive_reddit', [
+                E(S("reddit_thread"), S(f"{brand_id}_pos"), ValueAtom(data['positive_reddit'])),
+                E(S("brand_has_reddit"), S(brand_id), S(f"{brand_id}_pos")),
+                E(S("thread_sentiment"), S(f"{brand_id}_pos"), S("positive"))
+            ])
         
         # Add negative reddit threads (single string)
         if 'negative_reddit' in data and data['negative_reddit']:
-            self.metta.space().add_atom(E(S("reddit_thread"), S(f"{brand_id}_neg"), ValueAtom(data['negative_reddit'])))
-            self.metta.space().add_atom(E(S("brand_has_reddit"), S(brand_id), S(f"{brand_id}_neg")))
-            self.metta.space().add_atom(E(S("thread_sentiment"), S(f"{brand_id}_neg"), S("negative")))
+            self.replace_atoms(brand_id, 'negative_reddit', [
+                E(S("reddit_thread"), S(f"{brand_id}_neg"), ValueAtom(data['negative_reddit'])),
+                E(S("brand_has_reddit"), S(brand_id), S(f"{brand_id}_neg")),
+                E(S("thread_sentiment"), S(f"{brand_id}_neg"), S("negative"))
+            ])
         
         # Add positive reviews (single string)
         if 'positive_reviews' in data and data['positive_reviews']:
-            self.metta.space().add_atom(E(S("review"), S(f"{brand_id}_pos"), ValueAtom(data['positive_reviews'])))
-            self.metta.space().add_atom(E(S("brand_has_review"), S(brand_id), S(f"{brand_id}_pos")))
-            self.metta.space().add_atom(E(S("review_sentiment"), S(f"{brand_id}_pos"), S("positive")))
+            self.replace_atoms(brand_id, 'positive_reviews', [
+                E(S("review"), S(f"{brand_id}_pos"), ValueAtom(data['positive_reviews'])),
+                E(S("brand_has_review"), S(brand_id), S(f"{brand_id}_pos")),
+                E(S("review_sentiment"), S(f"{brand_id}_pos"), S("positive"))
+            ])
         
         # Add negative reviews (single string)
         if 'negative_reviews' in data and data['negative_reviews']:
-            self.metta.space().add_atom(E(S("review"), S(f"{brand_id}_neg"), ValueAtom(data['negative_reviews'])))
-            self.metta.space().add_atom(E(S("brand_has_review"), S(brand_id), S(f"{brand_id}_neg")))
-            self.metta.space().add_atom(E(S("review_sentiment"), S(f"{brand_id}_neg"), S("negative")))
+            self.replace_atoms(brand_id, 'negative_reviews', [
+                E(S("review"), S(f"{brand_id}_neg"), ValueAtom(data['negative_reviews'])),
+                E(S("brand_has_review"), S(brand_id), S(f"{brand_id}_neg")),
+                E(S("review_sentiment"), S(f"{brand_id}_neg"), S("negative"))
+            ])
         
         # Add positive social comments (single string)
         if 'positive_social' in data and data['positive_social']:
-            self.metta.space().add_atom(E(S("social_comment"), S(f"{brand_id}_pos"), ValueAtom(data['positive_social'])))
-            self.metta.space().add_atom(E(S("brand_has_social"), S(brand_id), S(f"{brand_id}_pos")))
-            self.metta.space().add_atom(E(S("comment_sentiment"), S(f"{brand_id}_pos"), S("positive")))
+            self.replace_atoms(brand_id, 'positive_social', [
+                E(S("social_comment"), S(f"{brand_id}_pos"), ValueAtom(data['positive_social'])),
+                E(S("brand_has_social"), S(brand_id), S(f"{brand_id}_pos")),
+                E(S("comment_sentiment"), S(f"{brand_id}_pos"), S("positive"))
+            ])
         
         # Add negative social comments (single string)
         if 'negative_social' in data and data['negative_social']:
-            self.metta.space().add_atom(E(S("social_comment"), S(f"{brand_id}_neg"), ValueAtom(data['negative_social'])))
-            self.metta.space().add_atom(E(S("brand_has_social"), S(brand_id), S(f"{brand_id}_neg")))
-            self.metta.space().add_atom(E(S("comment_sentiment"), S(f"{brand_id}_neg"), S("negative")))
+            self.replace_atoms(brand_id, 'negative_social', [
+                E(S("social_comment"), S(f"{brand_id}_neg"), ValueAtom(data['negative_social'])),
+                E(S("brand_has_social"), S(brand_id), S(f"{brand_id}_neg")),
+                E(S("comment_sentiment"), S(f"{brand_id}_neg"), S("negative"))
+            ])
         
         return f"Successfully added data for brand: {brand_name}"
     
@@ -194,697 +326,1284 @@ class BrandKnowledgeGraph:
         
         return summary
 
-# Initialize the knowledge graph service
-kg_service = BrandKnowledgeGraph()
+# The knowledge graph service, built on first use so a cold start doesn't import hyperon and
+# create the MeTTa space before it can answer its first request
+kg_service = None
+
+def get_kg_service():
+    global kg_service, MeTTa, E, S, ValueAtom
+    if kg_service is None:
+        started = time.monotonic()
+        from hyperon import MeTTa, E, S, ValueAtom
+        kg_service = BrandKnowledgeGraph()
+        print(f"🧠 Knowledge graph initialized in {time.monotonic() - started:.2f}s")
+    return kg_service
+
+class ResearchJob:
+    """A queued or running research pipeline for one brand."""
+    def __init__(self, brand_name, use_cache=True, refresh=False, job_id=None):
+        self.job_id = job_id or uuid4().hex
+        self.brand_name = brand_name
+        self.use_cache = use_cache
+        self.refresh = refresh
+        self.status = "queued"
+        self.results = {}
+        self.cached_stages = set()
+        # Stages that failed, with their error; the stages that need them are skipped
+        self.failed_stages = {}
+        # Collector results written to the knowledge graph, and the ones that failed to write
+        self.kg_stored = set()
+        self.kg_errors = {}
+        # What each knowledge graph key held before this job wrote it, as (atoms, updated_at), for rolling back
+        self.kg_previous = {}
+        # The same for the source cache entries this job replaced, per stage
+        self.cache_previous = {}
+        # Handed from the metrics stage to the bounty stage: the bounty callback to wait for, when bounties
+        # were requested, and the bounties to reuse when metrics came from cache
+        self.bounty_waiter = None
+        self.bounty_requested_at = None
+        self.cached_bounty = None
+        self.result = None
+        self.error = None
+        self.error_status_code = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+        # The task running the pipeline, clients waiting on the result, and whether anyone wants it without waiting
+        # (async submissions, deadline responses, the scheduler); only jobs nobody will read are cancelled on disconnect
+        self.task = None
+        self.watchers = 0
+        self.detached = False
+        self.cancel_reason = None
+        # Progress events for streaming clients; late joiners replay them from the start
+        self.events = []
+        self._wakeup = asyncio.Event()
+        self.publish("job_queued", None)
+    
+    @property
+    def singleflight_key(self):
+        return (normalize_brand_id(self.brand_name), self.use_cache, self.refresh)
+    
+    def record_stage(self, stage, value):
+        """Keep a finished stage's result so it can be served before the whole pipeline is done."""
+        self.results[stage] = value
+        if stage in PIPELINE_STAGES:
+            checkpoint_store.save_stage(self.job_id, stage, value, stage in self.cached_stages)
+        self.publish("kg_storage" if stage == "kg_storage" else f"{stage}_result", value, stage=stage)
+    
+    def record_failure(self, stage, error):
+        """Note a failed stage so partial responses can report it while the stages that don't need it keep running."""
+        self.failed_stages[stage] = error
+        self.publish("stage_failed", {"error": error}, stage=stage)
+    
+    def publish(self, event_type, data, stage=None):
+        """Append a progress event and wake up everyone streaming this job."""
+        self.events.append({
+            "event": event_type,
+            "job_id": self.job_id,
+            "brand_name": self.brand_name,
+            "stage": stage,
+            "cached": stage in self.cached_stages,
+            "data": data,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+    
+    async def iter_events(self, heartbeat_seconds=None):
+        """Yield every event so far, then new ones as they happen, until the job finishes. Yields None as a heartbeat."""
+        index = 0
+        while True:
+            wakeup = self._wakeup
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done.is_set():
+                return
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield None
+    
+    def partial_response(self):
+        """The response so far: finished stages filled in, the rest empty and listed in missing_stages."""
+        return OrchestratorResponse(
+            brand_name=self.brand_name,
+            **{f"{stage}_result": self.results.get(stage, "") for stage in PIPELINE_STAGES},
+            timestamp=datetime.now().isoformat(),
+            kg_storage_status=self.results.get(
+                "kg_storage",
+                f"Stored {len(self.kg_stored)} of {len(COLLECTOR_STAGES)} sources so far, the rest are stored as they finish"
+            ),
+            job_id=self.job_id,
+            partial=True,
+            missing_stages=[stage for stage in PIPELINE_STAGES if stage not in self.results],
+            failed_stages=dict(self.failed_stages)
+        )
+    
+    def to_status(self):
+        return JobStatus(
+            job_id=self.job_id,
+            brand_name=self.brand_name,
+            status=self.status,
+            stages_completed=list(self.results.keys()),
+            partial_results=self.results,
+            result=self.result,
+            error=self.error,
+            created_at=self.created_at.isoformat(),
+            started_at=self.started_at.isoformat() if self.started_at else None,
+            finished_at=self.finished_at.isoformat() if self.finished_at else None
+        )
+
+# Research jobs and the worker pool that runs them
+RESEARCH_WORKERS = int(os.environ.get("RESEARCH_WORKERS", 4))
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("STREAM_HEARTBEAT_SECONDS", 15))
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 3600))
+research_jobs = {}
+job_queue = asyncio.Queue()
+
+# Cancel a job's pipeline, with every agent call and poll loop in it, once all clients waiting on it disconnect
+CANCEL_ON_DISCONNECT = os.environ.get("CANCEL_ON_DISCONNECT", "true").lower() == "true"
+# Whether sources a cancelled job already stored stay in the knowledge graph; false rolls them back
+CANCELLED_JOBS_KEEP_RESULTS = os.environ.get("CANCELLED_JOBS_KEEP_RESULTS", "true").lower() == "true"
+DISCONNECT_CHECK_INTERVAL_SECONDS = float(os.environ.get("DISCONNECT_CHECK_INTERVAL_SECONDS", 1))
+cancellation_stats = {"disconnect": 0, "api": 0, "sources_rolled_back": 0}
+
+# Admission control: new pipelines are turned away with 429 once this many jobs are waiting for a worker
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 50))
+# Starting guess for how long a pipeline takes, replaced by a moving average of real runs
+PIPELINE_DURATION_ESTIMATE_SECONDS = float(os.environ.get("PIPELINE_DURATION_ESTIMATE_SECONDS", 600))
+admission_stats = {"admitted": 0, "rejected": 0, "average_pipeline_seconds": PIPELINE_DURATION_ESTIMATE_SECONDS}
+
+class QueueFullError(Exception):
+    """The research queue is full; the caller should come back after retry_after_seconds."""
+    status_code = 429
+    
+    def __init__(self, message, retry_after_seconds):
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+
+def estimated_retry_after():
+    """Seconds until a queue slot should free up: one pipeline's duration, spread over the workers."""
+    return max(1, min(3600, math.ceil(admission_stats["average_pipeline_seconds"] / RESEARCH_WORKERS)))
+
+# Queued or running job per brand id (and cache mode), so concurrent requests for one brand share a pipeline
+inflight_jobs = {}
+singleflight_stats = {"pipelines_started": 0, "requests_joined": 0, "agent_calls_saved": 0}
+
+# Collector agents don't depend on each other, so they all run at the same time
+COLLECTOR_STAGES = [
+    "web_search",
+    "negative_reviews",
+    "positive_reviews",
+    "negative_reddit",
+    "positive_reddit",
+    "negative_social",
+    "positive_social",
+]
+# Every stage that contributes a result to OrchestratorResponse, as <stage>_result
+PIPELINE_STAGES = COLLECTOR_STAGES + ["metrics", "bounty"]
+
+# Agent endpoints and how to call them, per stage. agents.json points at the deployed agents;
+# AGENT_REGISTRY_PATH=agents.local.json points at the stand-ins from stand_in_agents.py instead
+AGENT_REGISTRY_PATH = os.environ.get("AGENT_REGISTRY_PATH", "agents.json")
+REQUIRED_AGENT_SETTINGS = ["label", "url", "result_field", "connect_timeout_seconds", "read_timeout_seconds"]
+REQUIRED_COLLECTOR_SETTINGS = ["kg_key", "deadline_seconds", "cache_ttl_seconds"]
+
+def load_agent_registry(path):
+    """Load the agent registry, resolving relative paths against this directory, and check every stage is configured."""
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    with open(path) as f:
+        registry = json.load(f)
+    
+    for stage in PIPELINE_STAGES:
+        if stage not in registry:
+            raise ValueError(f"Agent registry {path} has no '{stage}' agent")
+        agent = registry[stage]
+        required = list(REQUIRED_AGENT_SETTINGS)
+        if stage in COLLECTOR_STAGES:
+            required += REQUIRED_COLLECTOR_SETTINGS
+        if agent.get("method", "POST") == "POST":
+            required.append("payload_key")
+        missing = [setting for setting in required if setting not in agent]
+        if missing:
+            raise ValueError(f"Agent '{stage}' in {path} is missing {', '.join(missing)}")
+    
+    print(f"📒 Loaded {len(registry)} agents from {path}")
+    return registry
+
+AGENTS = load_agent_registry(AGENT_REGISTRY_PATH)
+
+def build_pipeline_graph():
+    """
+    The research pipeline as a dependency graph, stage -> stages it needs, ordered so needs come first.
+    Collectors need nothing and kg_storage needs every collector; any agent can declare "needs" in the registry.
+    """
+    needs = {stage: list(AGENTS[stage].get("needs", [])) for stage in COLLECTOR_STAGES}
+    needs["kg_storage"] = list(COLLECTOR_STAGES)
+    needs["metrics"] = list(AGENTS["metrics"].get("needs", ["kg_storage"]))
+    needs["bounty"] = list(AGENTS["bounty"].get("needs", ["metrics"]))
+    if "metrics" not in needs["bounty"]:
+        raise ValueError("The bounty stage must need metrics, since the metrics agent is what starts bounty generation")
+    
+    graph = {}
+    while len(graph) < len(needs):
+        ready = [stage for stage in needs if stage not in graph and all(need in graph for need in needs[stage])]
+        if not ready:
+            stuck = [stage for stage in needs if stage not in graph]
+            raise ValueError(f"Pipeline stages {', '.join(stuck)} need unknown stages or each other")
+        for stage in ready:
+            graph[stage] = needs[stage]
+    return graph
+
+# Each stage starts as soon as every stage it needs has finished
+PIPELINE_GRAPH = build_pipeline_graph()
+
+# Numeric agent settings can be overridden per agent, e.g. WEB_SEARCH_READ_TIMEOUT_SECONDS=900
+for stage, agent in AGENTS.items():
+    for setting in ("deadline_seconds", "connect_timeout_seconds", "read_timeout_seconds", "cache_ttl_seconds", "cache_stale_seconds", "max_concurrency",
+                    "rate_limit_per_second", "rate_limit_burst"):
+        if setting in agent:
+            agent[setting] = float(os.environ.get(f"{stage.upper()}_{setting.upper()}", agent[setting]))
+
+# Requests in flight to each agent are capped at its max_concurrency, across all pipelines,
+# so bursts (batches especially) don't overload the Exa- and Apify-backed agents
+agent_slots = {
+    stage: asyncio.Semaphore(int(agent["max_concurrency"]))
+    for stage, agent in AGENTS.items() if "max_concurrency" in agent
+}
+
+class TokenBucket:
+    """
+    Requests per second to one agent, shared by every pipeline so together they stay under the upstream quota.
+    When requests have to wait, brands take turns, so one brand's retries and polls can't starve the others.
+    """
+    def __init__(self, stage, rate, burst):
+        self.stage = stage
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # Requests waiting for a token per brand, in the order brands take turns
+        self.waiters = OrderedDict()
+        self.grant_handle = None
+    
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self, brand_name):
+        """Wait for a token, queued behind brands that have waited fewer turns."""
+        self.refill()
+        if not self.waiters and self.tokens >= 1:
+            self.tokens -= 1
+            AGENT_RATE_LIMIT_WAIT.labels(self.stage).observe(0)
+            return
+        
+        started = time.monotonic()
+        brand_id = normalize_brand_id(brand_name)
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(brand_id, deque()).append(waiter)
+        self.schedule_grant()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            queue = self.waiters.get(brand_id)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self.waiters[brand_id]
+            elif waiter.done() and not waiter.cancelled():
+                # Granted just as we were cancelled; hand the token back
+                self.tokens += 1
+                self.schedule_grant()
+            raise
+        finally:
+            AGENT_RATE_LIMIT_WAIT.labels(self.stage).observe(time.monotonic() - started)
+    
+    def schedule_grant(self):
+        if self.grant_handle is None and self.waiters:
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            self.grant_handle = asyncio.get_running_loop().call_later(delay, self.grant)
+    
+    def grant(self):
+        """Hand out the tokens that have refilled, one per brand in turn."""
+        self.grant_handle = None
+        self.refill()
+        while self.waiters and self.tokens >= 1:
+            brand_id, queue = next(iter(self.waiters.items()))
+            waiter = queue.popleft()
+            if queue:
+                self.waiters.move_to_end(brand_id)
+            else:
+                del self.waiters[brand_id]
+            if not waiter.done():
+                waiter.set_result(None)
+                self.tokens -= 1
+        self.schedule_grant()
+    
+    def throttled(self):
+        """The agent answered 429, so the quota is already used up: stop handing out the burst."""
+        self.refill()
+        self.tokens = min(self.tokens, 0)
+    
+    def stats(self):
+        self.refill()
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "waiting": sum(len(queue) for queue in self.waiters.values()),
+            "brands_waiting": len(self.waiters)
+        }
+
+# Agents with a rate_limit_per_second get a token bucket; every request to them (polls and hedges too) takes a token
+rate_limits = {
+    stage: TokenBucket(stage, agent["rate_limit_per_second"], agent.get("rate_limit_burst", max(1, agent["rate_limit_per_second"])))
+    for stage, agent in AGENTS.items() if agent.get("rate_limit_per_second")
+}
+
+def agent_timeout(stage):
+    """Connect/read timeouts for one agent's requests."""
+    agent = AGENTS[stage]
+    return httpx.Timeout(
+        connect=agent["connect_timeout_seconds"],
+        read=agent["read_timeout_seconds"],
+        write=agent["connect_timeout_seconds"],
+        pool=HTTP_POOL_TIMEOUT_SECONDS
+    )
+
+# Shared HTTP client, created once in the app lifespan so connections (and TLS sessions) are reused
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 200))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 50))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY_SECONDS", 120))
+HTTP_POOL_TIMEOUT_SECONDS = float(os.environ.get("HTTP_POOL_TIMEOUT_SECONDS", 60))
+http_client = None
+
+# Connection pool counters; every request that didn't open a connection reused one
+http_pool_stats = {"requests": 0, "connections_opened": 0, "http2_responses": 0}
+
+async def trace_connection_events(event_name, info):
+    if event_name.endswith("connect_tcp.complete"):
+        http_pool_stats["connections_opened"] += 1
+
+async def track_request(request):
+    http_pool_stats["requests"] += 1
+    request.extensions["trace"] = trace_connection_events
+
+async def track_response(response):
+    if response.http_version == "HTTP/2":
+        http_pool_stats["http2_responses"] += 1
+
+def create_http_client():
+    """Build the application-wide HTTP client with keep-alive pooling and HTTP/2."""
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+        ),
+        timeout=httpx.Timeout(30.0, pool=HTTP_POOL_TIMEOUT_SECONDS),
+        event_hooks={"request": [track_request], "response": [track_response]}
+    )
+
+# Prometheus metrics served on /metrics
+AGENT_LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, 1800)
+KG_LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+STAGE_DURATION = Histogram(
+    "orchestrator_stage_duration_seconds",
+    "Time for a pipeline stage to produce its result, including retries and polling",
+    ["stage", "outcome"],
+    buckets=AGENT_LATENCY_BUCKETS
+)
+AGENT_REQUEST_DURATION = Histogram(
+    "orchestrator_agent_request_duration_seconds",
+    "Time for a single HTTP request to an agent",
+    ["stage", "outcome"],
+    buckets=AGENT_LATENCY_BUCKETS
+)
+AGENT_RETRIES = Counter("orchestrator_agent_retries_total", "Agent calls retried after a failure", ["stage"])
+AGENT_RATE_LIMIT_WAIT = Histogram(
+    "orchestrator_agent_rate_limit_wait_seconds",
+    "Time requests waited for a rate limit token, per agent",
+    ["stage"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+AGENT_REQUESTS_IN_FLIGHT = Gauge("orchestrator_agent_requests_in_flight", "Requests currently sent to each agent", ["stage"])
+AGENT_HEDGES = Counter("orchestrator_agent_hedges_total", "Hedge requests sent to slow agents, and how many answered first", ["stage", "outcome"])
+AGENT_POLLS = Counter("orchestrator_agent_polls_total", "Polls sent to agents that were still processing", ["stage"])
+AGENT_CIRCUIT_OPEN = Gauge("orchestrator_agent_circuit_open", "1 while an agent's circuit breaker is open or half-open", ["stage"])
+PIPELINES_IN_FLIGHT = Gauge("orchestrator_pipelines_in_flight", "Research pipelines currently running")
+JOBS_QUEUED = Gauge("orchestrator_jobs_queued", "Research jobs waiting for a worker")
+JOBS_QUEUED.set_function(lambda: job_queue.qsize())
+JOBS_REJECTED = Counter("orchestrator_jobs_rejected_total", "Research requests turned away because the queue was full")
+JOBS_CANCELLED = Counter("orchestrator_jobs_cancelled_total", "Research jobs cancelled before finishing", ["reason"])
+PIPELINE_DURATION = Histogram(
+    "orchestrator_pipeline_duration_seconds",
+    "Time from a job starting to it finishing",
+    ["status"],
+    buckets=AGENT_LATENCY_BUCKETS
+)
+EVENT_LOOP_LAG = Histogram(
+    "orchestrator_event_loop_lag_seconds",
+    "How late the event loop woke a task that asked to sleep; blocking work (like large KG writes) shows up here",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get("EVENT_LOOP_LAG_INTERVAL_SECONDS", 0.5))
+REFRESH_SOURCES = Counter(
+    "orchestrator_refresh_sources_total",
+    "Sources considered by refresh runs, by whether the stored copy was reused or fetched again",
+    ["stage", "outcome"]
+)
+SCHEDULER_DUE_BRANDS = Gauge("orchestrator_scheduler_due_brands", "Tracked brands with at least one source past its freshness policy")
+SCHEDULER_RUNS = Counter("orchestrator_scheduler_runs_total", "Re-research jobs started by the background scheduler")
+KG_OPERATION_DURATION = Histogram(
+    "orchestrator_kg_operation_duration_seconds",
+    "Time spent in knowledge graph writes and queries",
+    ["operation"],
+    buckets=KG_LATENCY_BUCKETS
+)
+
+class StatsCollector:
+    """Exports the HTTP pool, single-flight and source cache counters that /health also reports."""
+    def describe(self):
+        # Without this, registering calls collect() to find the metric names, before source_cache exists
+        return []
+    
+    def collect(self):
+        # Reading the KG counts shouldn't be what builds it
+        kg = kg_service
+        for name, value in http_pool_stats.items():
+            yield CounterMetricFamily(f"orchestrator_http_{name}", f"HTTP client {name.replace('_', ' ')}", value=value)
+        for name, value in singleflight_stats.items():
+            yield CounterMetricFamily(f"orchestrator_singleflight_{name}", f"Single-flight {name.replace('_', ' ')}", value=value)
+        for name, value in source_cache.stats.items():
+            yield CounterMetricFamily(f"orchestrator_source_cache_{name}", f"Source cache {name.replace('_', ' ')}", value=value)
+        yield GaugeMetricFamily("orchestrator_source_cache_entries", "Entries held in the source cache", value=len(source_cache.entries))
+        yield GaugeMetricFamily("orchestrator_kg_brands", "Brands stored in the knowledge graph",
+                                value=len({brand_id for brand_id, key in kg.brand_atoms}) if kg else 0)
+        yield GaugeMetricFamily("orchestrator_kg_atoms", "Brand data atoms stored in the knowledge graph",
+                                value=sum(len(atoms) for atoms in kg.brand_atoms.values()) if kg else 0)
+
+async def monitor_event_loop_lag():
+    """Sleep in a loop and record how much later than asked the event loop woke us up."""
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+        EVENT_LOOP_LAG.observe(max(time.monotonic() - started - EVENT_LOOP_LAG_INTERVAL_SECONDS, 0))
+
+REGISTRY.register(StatsCollector())
+
+# Default retry policy and circuit breaker settings; agents can override any of them in AGENTS
+DEFAULT_RETRY_POLICY = {
+    "max_attempts": 6,
+    "base_delay_seconds": 2,
+    "max_delay_seconds": 30,
+    "retry_budget_seconds": 600,
+    "poll_interval_seconds": 4,
+    "max_polls": 150,
+    # Once enough polled calls have finished, the first poll waits until the poll_quantile of their completion
+    # times and later polls back off from min_poll_interval_seconds; until then polls use poll_interval_seconds
+    "adaptive_polling": True,
+    "poll_quantile": 0.5,
+    "poll_min_samples": 10,
+    "min_poll_interval_seconds": 0.5,
+    "max_poll_interval_seconds": 30,
+    "poll_backoff": 1.5,
+}
+DEFAULT_CIRCUIT_BREAKER = {
+    "failure_threshold": 5,
+    "reset_timeout_seconds": 60,
+}
+# Hedging is off unless an agent's "hedge" settings enable it
+DEFAULT_HEDGE_POLICY = {
+    "enabled": False,
+    "quantile": 0.9,            # send the second request once the first has taken longer than this latency quantile
+    "min_delay_seconds": 1,     # never hedge sooner than this
+    "budget_ratio": 0.1,        # at most this many hedges per request sent
+    "min_samples": 20,          # latencies needed before the quantile is trusted
+    "window": 200,              # recent latencies the quantile is taken over
+}
+
+class AgentCallError(Exception):
+    """An agent call that failed for good: retries exhausted or the failure isn't worth retrying."""
+    status_code = 502
+    
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+
+class AgentUnavailableError(AgentCallError):
+    """The agent's circuit breaker is open, so the call wasn't even attempted."""
+    status_code = 503
+
+class RetryPolicy:
+    """How an agent call backs off between attempts and when it gives up."""
+    def __init__(self, max_attempts, base_delay_seconds, max_delay_seconds, retry_budget_seconds, poll_interval_seconds, max_polls,
+                 adaptive_polling, poll_quantile, poll_min_samples, min_poll_interval_seconds, max_poll_interval_seconds, poll_backoff):
+        self.max_attempts = int(max_attempts)
+        self.base_delay_seconds = float(base_delay_seconds)
+        self.max_delay_seconds = float(max_delay_seconds)
+        self.retry_budget_seconds = float(retry_budget_seconds)
+        self.poll_interval_seconds = float(poll_interval_seconds)
+        self.max_polls = int(max_polls)
+        self.adaptive_polling = bool(adaptive_polling)
+        self.poll_quantile = float(poll_quantile)
+        self.poll_min_samples = int(poll_min_samples)
+        self.min_poll_interval_seconds = float(min_poll_interval_seconds)
+        self.max_poll_interval_seconds = float(max_poll_interval_seconds)
+        self.poll_backoff = float(poll_backoff)
+    
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter, so failing callers don't retry in lockstep."""
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+    
+    def poll_delay(self, elapsed, late_polls, expected_completion):
+        """
+        How long to wait before the next poll, elapsed seconds after the call's first request.
+        Waits until the expected completion time, then backs off with each poll that comes back still processing.
+        """
+        if not self.adaptive_polling or expected_completion is None:
+            return self.poll_interval_seconds
+        if elapsed < expected_completion:
+            return max(expected_completion - elapsed, self.min_poll_interval_seconds)
+        return min(self.max_poll_interval_seconds, self.min_poll_interval_seconds * self.poll_backoff ** late_polls)
+
+class CircuitBreaker:
+    """Fails calls fast once an agent keeps failing, then lets one trial call through after a cool-down."""
+    def __init__(self, stage, failure_threshold, reset_timeout_seconds):
+        self.stage = stage
+        self.name = AGENTS[stage]["label"]
+        self.failure_threshold = int(failure_threshold)
+        self.reset_timeout_seconds = float(reset_timeout_seconds)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+    
+    def allow_request(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout_seconds:
+                return False
+            self.state = "half_open"
+            self.trial_in_flight = False
+        if self.state == "half_open":
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+        return True
+    
+    def record_success(self):
+        if self.state != "closed":
+            print(f"🟢 Circuit for {self.name} closed again")
+        self.state = "closed"
+        self.failures = 0
+        self.trial_in_flight = False
+        AGENT_CIRCUIT_OPEN.labels(self.stage).set(0)
+    
+    def release_trial(self):
+        """The trial call ended without an outcome (it was cancelled), so let the next call be the trial."""
+        self.trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"🔴 Circuit for {self.name} opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            AGENT_CIRCUIT_OPEN.labels(self.stage).set(1)
+
+retry_policies = {
+    stage: RetryPolicy(**{**DEFAULT_RETRY_POLICY, **agent.get("retry", {})})
+    for stage, agent in AGENTS.items()
+}
+circuit_breakers = {
+    stage: CircuitBreaker(stage, **{**DEFAULT_CIRCUIT_BREAKER, **agent.get("circuit_breaker", {})})
+    for stage, agent in AGENTS.items()
+}
+hedge_policies = {stage: {**DEFAULT_HEDGE_POLICY, **agent.get("hedge", {})} for stage, agent in AGENTS.items()}
+# Recent successful request latencies per agent, for the hedge delay
+agent_latencies = {stage: deque(maxlen=int(policy["window"])) for stage, policy in hedge_policies.items()}
+hedge_stats = {stage: {"requests": 0, "hedges": 0, "hedge_wins": 0} for stage in AGENTS}
+# How long recent calls that had to be polled took to finish, per agent, for scheduling polls
+completion_times = {stage: deque(maxlen=200) for stage in AGENTS}
+
+def expected_completion(stage):
+    """The poll_quantile of recent polled calls' completion times, or None until there are poll_min_samples of them."""
+    policy = retry_policies[stage]
+    times = completion_times[stage]
+    if len(times) < policy.poll_min_samples:
+        return None
+    ordered = sorted(times)
+    return ordered[min(int(policy.poll_quantile * len(ordered)), len(ordered) - 1)]
+
+def hedge_delay(stage):
+    """How long to wait for a request before hedging it, or None if hedging is off or there's no latency history yet."""
+    policy = hedge_policies[stage]
+    latencies = agent_latencies[stage]
+    if not policy["enabled"] or len(latencies) < policy["min_samples"]:
+        return None
+    ordered = sorted(latencies)
+    return max(ordered[min(int(policy["quantile"] * len(ordered)), len(ordered) - 1)], policy["min_delay_seconds"])
 
-@app.post("/research-brand", response_model=OrchestratorResponse)
-async def research_brand(request: BrandRequest):
+async def send_agent_request(client, stage, brand_name):
     """
-    Orchestrator that sequentially calls all 7 agents and stores results in knowledge graph
+    Send a request to an agent and return its JSON body. If the agent hedges and this request outlasts its recent
+    latency quantile (p90 by default), a second identical request is sent within the hedge budget and the first answer wins.
     """
-    brand_name = request.brand_name
+    stats = hedge_stats[stage]
+    stats["requests"] += 1
+    delay = hedge_delay(stage)
+    if delay is None:
+        return await send_agent_request_once(client, stage, brand_name)
     
+    primary = asyncio.create_task(send_agent_request_once(client, stage, brand_name))
+    tasks = [primary]
     try:
-        print(f"Starting brand analysis for: {brand_name}")
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or stats["hedges"] + 1 > hedge_policies[stage]["budget_ratio"] * stats["requests"]:
+            return await primary
+        
+        stats["hedges"] += 1
+        AGENT_HEDGES.labels(stage, "sent").inc()
+        print(f"🪃 {AGENTS[stage]['label']} request for {brand_name} slower than {delay:.1f}s, sending a hedge request")
+        hedge = asyncio.create_task(send_agent_request_once(client, stage, brand_name))
+        tasks.append(hedge)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        stats["hedge_wins"] += 1
+                        AGENT_HEDGES.labels(stage, "won").inc()
+                    return task.result()
+        # Both failed; report the original request's error
+        return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def send_agent_request_once(client, stage, brand_name):
+    """Send a single request to an agent, within its rate limit and concurrency cap, and return its JSON body."""
+    agent = AGENTS[stage]
+    bucket = rate_limits.get(stage)
+    if bucket is not None:
+        await bucket.acquire(brand_name)
+    async with agent_slots.get(stage) or nullcontext():
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            with AGENT_REQUESTS_IN_FLIGHT.labels(stage).track_inprogress():
+                if agent.get("method", "POST") == "GET":
+                    response = await client.get(agent["url"].format(brand_name=quote(brand_name)), timeout=agent_timeout(stage))
+                else:
+                    response = await client.post(agent["url"], json={agent["payload_key"]: brand_name}, timeout=agent_timeout(stage))
+            outcome = str(response.status_code)
+            if response.status_code == 429 and bucket is not None:
+                bucket.throttled()
+            response.raise_for_status()
+            data = response.json()
+            # A "still processing" answer comes back fast and would drag the hedge delay down
+            if data.get("status") != "processing":
+                agent_latencies[stage].append(time.monotonic() - started)
+            return data
+        finally:
+            AGENT_REQUEST_DURATION.labels(stage, outcome).observe(time.monotonic() - started)
+
+def interpret_agent_response(stage, data):
+    """
+    Classify an agent response by its status envelope (status "ok", "processing" or "failed", with retryable
+    and error on failures) as ("done", result, None), ("processing", None, None) or ("failed", reason, retryable).
+    The result text is never inspected, so a review that mentions "error messages" or "$500" is still a result.
+    """
+    agent = AGENTS[stage]
+    result_field = agent["result_field"]
+    # Agents without the envelope only say success true or false
+    status = data.get("status") or ("ok" if data.get("success") else "failed")
+    if status == "ok":
+        if result_field not in data:
+            return "failed", f"agent response has no '{result_field}'", True
+        # Whole-response agents (metrics) return the response itself as the result
+        result = str(data) if agent.get("result_format") == "response" else data[result_field]
+        return "done", result, None
+    if status == "processing":
+        return "processing", None, None
+    return "failed", data.get("error") or f"agent reported status '{status}'", data.get("retryable", True)
+
+async def call_agent(client, stage, brand_name):
+    """
+    Call an agent under its retry policy and circuit breaker, polling while it is still processing.
+    Raises AgentCallError once the attempts or retry budget run out, or AgentUnavailableError if the circuit is open.
+    """
+    agent = AGENTS[stage]
+    label = agent["label"]
+    policy = retry_policies[stage]
+    breaker = circuit_breakers[stage]
+    started = time.monotonic()
+    attempt = 0
+    
+    while True:
+        attempt += 1
+        if not breaker.allow_request():
+            raise AgentUnavailableError(stage, f"{label} agent is unavailable (circuit open), not calling it")
         
-        async with httpx.AsyncClient(timeout=None) as client:
+        retryable = True
+        try:
+            print(f"{label} attempt {attempt}/{policy.max_attempts}")
+            attempt_started = time.monotonic()
+            outcome, value, retryable_failure = interpret_agent_response(stage, await send_agent_request(client, stage, brand_name))
             
-            # === 1. WEB SEARCH AGENT ===
-            print(f"\n🔍 Step 1: Calling Web Search Agent for {brand_name}...")
-            web_search_response = await client.post(
-                "https://websearchagent-739298578243.us-central1.run.app/research/brand",
-                json={"brand_name": brand_name}
-            )
-            web_search_response.raise_for_status()
-            web_search_data = web_search_response.json()
+            # The agent is still processing, so poll for results: first around when calls like this usually finish,
+            # then more and more slowly
+            poll_attempt = 0
+            late_polls = 0
+            expected = expected_completion(stage)
+            while outcome == "processing" and poll_attempt < policy.max_polls:
+                poll_attempt += 1
+                AGENT_POLLS.labels(stage).inc()
+                elapsed = time.monotonic() - attempt_started
+                delay = policy.poll_delay(elapsed, late_polls, expected)
+                if expected is not None and elapsed >= expected:
+                    late_polls += 1
+                print(f"{label} polling attempt {poll_attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                outcome, value, retryable_failure = interpret_agent_response(stage, await send_agent_request(client, stage, brand_name))
             
-            # Check if we got the final result immediately
-            if web_search_data.get("success") and "research_result" in web_search_data:
-                web_search_result = web_search_data["research_result"]
+            if outcome == "done":
+                if poll_attempt:
+                    completion_times[stage].append(time.monotonic() - attempt_started)
+                breaker.record_success()
+                print(f"✅ {label} completed after {attempt} attempts and {poll_attempt} polls!")
+                return value
+            if outcome == "failed":
+                failure = value
+                # The agent knows whether its failure is worth retrying, e.g. an upstream outage vs. a rejected query
+                retryable = retryable_failure
             else:
-                # The agent is still processing, we need to poll for results
-                print(f"Web search agent is processing... Status: {web_search_data.get('status', 'unknown')}")
-                
-                # Poll for results indefinitely until we get a result
-                poll_interval = 4
-                attempt = 0
-                
-                while True:
-                    attempt += 1
-                    print(f"Web search polling attempt {attempt}")
-                    await asyncio.sleep(poll_interval)
-                    
-                    # Make another request to check status
-                    poll_response = await client.post(
-                        "https://websearchagent-739298578243.us-central1.run.app/research/brand",
-                        json={"brand_name": brand_name}
-                    )
-                    poll_response.raise_for_status()
-                    poll_data = poll_response.json()
-                    
-                    # Check if research is complete
-                    if poll_data.get("success") and "research_result" in poll_data:
-                        web_search_result = poll_data["research_result"]
-                        print(f"✅ Web search completed after {attempt} polling attempts!")
-                        break
-                    elif poll_data.get("status") == "error":
-                        raise HTTPException(status_code=500, detail="Web search agent encountered an error")
-                    else:
-                        print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-            
-            # Print the web search result
-            print(f"\n=== WEB SEARCH RESULT FOR {brand_name.upper()} ===")
-            print(web_search_result)
-            print("=" * 50)
-            
-            # === 2. NEGATIVE REVIEWS AGENT ===
-            print(f"\n👎 Step 2: Calling Negative Reviews Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative reviews attempt {attempt}")
-                    negative_reviews_response = await client.post(
-                        "https://negativereviewsagent-739298578243.us-central1.run.app/reviews/negative",
-                        json={"brand_name": brand_name}
-                    )
-                    negative_reviews_response.raise_for_status()
-                    negative_reviews_data = negative_reviews_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if negative_reviews_data.get("success") and "reviews_result" in negative_reviews_data:
-                        # Check if the result contains an error message
-                        if "error" in negative_reviews_data["reviews_result"].lower() or "500" in negative_reviews_data["reviews_result"]:
-                            print(f"❌ Negative reviews returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_reviews_result = negative_reviews_data["reviews_result"]
-                        print(f"✅ Negative reviews completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Negative reviews agent is processing... Status: {negative_reviews_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Negative reviews polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://negativereviewsagent-739298578243.us-central1.run.app/reviews/negative",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reviews_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reviews_result"].lower() or "500" in poll_data["reviews_result"]:
-                                    print(f"❌ Negative reviews polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                negative_reviews_result = poll_data["reviews_result"]
-                                print(f"✅ Negative reviews completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Negative reviews agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'negative_reviews_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Negative reviews request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the negative reviews result
-            print(f"\n=== NEGATIVE REVIEWS RESULT FOR {brand_name.upper()} ===")
-            print(negative_reviews_result)
-            print("=" * 50)
-            
-            # === 3. POSITIVE REVIEWS AGENT ===
-            print(f"\n👍 Step 3: Calling Positive Reviews Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive reviews attempt {attempt}")
-                    positive_reviews_response = await client.post(
-                        "https://positivereviewsagent-739298578243.us-central1.run.app/reviews/positive",
-                        json={"brand_name": brand_name}
-                    )
-                    positive_reviews_response.raise_for_status()
-                    positive_reviews_data = positive_reviews_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if positive_reviews_data.get("success") and "reviews_result" in positive_reviews_data:
-                        # Check if the result contains an error message
-                        if "error" in positive_reviews_data["reviews_result"].lower() or "500" in positive_reviews_data["reviews_result"]:
-                            print(f"❌ Positive reviews returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_reviews_result = positive_reviews_data["reviews_result"]
-                        print(f"✅ Positive reviews completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Positive reviews agent is processing... Status: {positive_reviews_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Positive reviews polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://positivereviewsagent-739298578243.us-central1.run.app/reviews/positive",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reviews_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reviews_result"].lower() or "500" in poll_data["reviews_result"]:
-                                    print(f"❌ Positive reviews polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                positive_reviews_result = poll_data["reviews_result"]
-                                print(f"✅ Positive reviews completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Positive reviews agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'positive_reviews_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Positive reviews request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the positive reviews result
-            print(f"\n=== POSITIVE REVIEWS RESULT FOR {brand_name.upper()} ===")
-            print(positive_reviews_result)
-            print("=" * 50)
-            
-            # === 4. NEGATIVE REDDIT AGENT ===
-            print(f"\n📱👎 Step 4: Calling Negative Reddit Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative reddit attempt {attempt}")
-                    negative_reddit_response = await client.post(
-                        "https://redditnegativeagent-739298578243.us-central1.run.app/reddit/negative",
-                        json={"product_name": brand_name}
-                    )
-                    negative_reddit_response.raise_for_status()
-                    negative_reddit_data = negative_reddit_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if negative_reddit_data.get("success") and "reddit_result" in negative_reddit_data:
-                        # Check if the result contains an error message
-                        if "error" in negative_reddit_data["reddit_result"].lower() or "500" in negative_reddit_data["reddit_result"]:
-                            print(f"❌ Negative reddit returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_reddit_result = negative_reddit_data["reddit_result"]
-                        print(f"✅ Negative reddit completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Negative reddit agent is processing... Status: {negative_reddit_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Negative reddit polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://redditnegativeagent-739298578243.us-central1.run.app/reddit/negative",
-                                json={"product_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reddit_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reddit_result"].lower() or "500" in poll_data["reddit_result"]:
-                                    print(f"❌ Negative reddit polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                negative_reddit_result = poll_data["reddit_result"]
-                                print(f"✅ Negative reddit completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Negative reddit agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'negative_reddit_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Negative reddit request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the negative reddit result
-            print(f"\n=== NEGATIVE REDDIT RESULT FOR {brand_name.upper()} ===")
-            print(negative_reddit_result)
-            print("=" * 50)
-            
-            # === 5. POSITIVE REDDIT AGENT ===
-            print(f"\n📱👍 Step 5: Calling Positive Reddit Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive reddit attempt {attempt}")
-                    positive_reddit_response = await client.post(
-                        "https://redditpositiveagent-739298578243.us-central1.run.app/reddit/positive",
-                        json={"product_name": brand_name}
-                    )
-                    positive_reddit_response.raise_for_status()
-                    positive_reddit_data = positive_reddit_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if positive_reddit_data.get("success") and "reddit_result" in positive_reddit_data:
-                        # Check if the result contains an error message
-                        if "error" in positive_reddit_data["reddit_result"].lower() or "500" in positive_reddit_data["reddit_result"]:
-                            print(f"❌ Positive reddit returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_reddit_result = positive_reddit_data["reddit_result"]
-                        print(f"✅ Positive reddit completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Positive reddit agent is processing... Status: {positive_reddit_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Positive reddit polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://redditpositiveagent-739298578243.us-central1.run.app/reddit/positive",
-                                json={"product_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "reddit_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["reddit_result"].lower() or "500" in poll_data["reddit_result"]:
-                                    print(f"❌ Positive reddit polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                positive_reddit_result = poll_data["reddit_result"]
-                                print(f"✅ Positive reddit completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Positive reddit agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'positive_reddit_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Positive reddit request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the positive reddit result
-            print(f"\n=== POSITIVE REDDIT RESULT FOR {brand_name.upper()} ===")
-            print(positive_reddit_result)
-            print("=" * 50)
-            
-            # === 6. NEGATIVE SOCIAL AGENT ===
-            print(f"\n📱👎 Step 6: Calling Negative Social Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Negative social attempt {attempt}")
-                    negative_social_response = await client.post(
-                        "https://negativesocialsagent-739298578243.us-central1.run.app/social/negative",
-                        json={"brand_name": brand_name}
-                    )
-                    negative_social_response.raise_for_status()
-                    negative_social_data = negative_social_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if negative_social_data.get("success") and "social_media_result" in negative_social_data:
-                        # Check if the result contains an error message
-                        if "error" in negative_social_data["social_media_result"].lower() or "500" in negative_social_data["social_media_result"]:
-                            print(f"❌ Negative social returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        negative_social_result = negative_social_data["social_media_result"]
-                        print(f"✅ Negative social completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Negative social agent is processing... Status: {negative_social_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Negative social polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://negativesocialsagent-739298578243.us-central1.run.app/social/negative",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "social_media_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["social_media_result"].lower() or "500" in poll_data["social_media_result"]:
-                                    print(f"❌ Negative social polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                negative_social_result = poll_data["social_media_result"]
-                                print(f"✅ Negative social completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Negative social agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'negative_social_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Negative social request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the negative social result
-            print(f"\n=== NEGATIVE SOCIAL RESULT FOR {brand_name.upper()} ===")
-            print(negative_social_result)
-            print("=" * 50)
-            
-            # === 7. POSITIVE SOCIAL AGENT ===
-            print(f"\n📱👍 Step 7: Calling Positive Social Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Positive social attempt {attempt}")
-                    positive_social_response = await client.post(
-                        "https://positivesocialsagent-739298578243.us-central1.run.app/social/positive",
-                        json={"brand_name": brand_name}
-                    )
-                    positive_social_response.raise_for_status()
-                    positive_social_data = positive_social_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if positive_social_data.get("success") and "social_media_result" in positive_social_data:
-                        # Check if the result contains an error message
-                        if "error" in positive_social_data["social_media_result"].lower() or "500" in positive_social_data["social_media_result"]:
-                            print(f"❌ Positive social returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        positive_social_result = positive_social_data["social_media_result"]
-                        print(f"✅ Positive social completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Positive social agent is processing... Status: {positive_social_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Positive social polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://positivesocialsagent-739298578243.us-central1.run.app/social/positive",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "social_media_result" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in poll_data["social_media_result"].lower() or "500" in poll_data["social_media_result"]:
-                                    print(f"❌ Positive social polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                positive_social_result = poll_data["social_media_result"]
-                                print(f"✅ Positive social completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Positive social agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'positive_social_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Positive social request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the positive social result
-            print(f"\n=== POSITIVE SOCIAL RESULT FOR {brand_name.upper()} ===")
-            print(positive_social_result)
-            print("=" * 50)
-            
-            print(f"\n🎉 ALL ANALYSIS COMPLETE FOR {brand_name.upper()}!")
-            
-            # === STORE RESULTS IN KNOWLEDGE GRAPH ===
-            print(f"\n🗄️ Storing results in Knowledge Graph for {brand_name}...")
-            try:
-                brand_data = {
-                    "web_results": web_search_result,
-                    "positive_reddit": positive_reddit_result,
-                    "negative_reddit": negative_reddit_result,
-                    "positive_reviews": positive_reviews_result,
-                    "negative_reviews": negative_reviews_result,
-                    "positive_social": positive_social_result,
-                    "negative_social": negative_social_result
-                }
-                
-                kg_result = kg_service.add_brand_data(brand_name, brand_data)
-                print(f"✅ Knowledge Graph storage successful: {kg_result}")
-                kg_storage_status = "Successfully stored in Knowledge Graph"
-                
-            except Exception as e:
-                print(f"❌ Knowledge Graph storage failed: {e}")
-                kg_storage_status = f"Knowledge Graph storage failed: {str(e)}"
-            
-            # === 8. METRICS AGENT ===
-            print(f"\n📊 Step 8: Calling Metrics Agent for {brand_name}...")
-            
-            # Keep retrying until we get a successful response
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    print(f"Metrics agent attempt {attempt}")
-                    metrics_response = await client.post(
-                        "https://metricsagent-739298578243.us-central1.run.app/brand/metrics",
-                        json={"brand_name": brand_name}
-                    )
-                    metrics_response.raise_for_status()
-                    metrics_data = metrics_response.json()
-                    
-                    # Check if we got the final result immediately
-                    if metrics_data.get("success") and "metrics" in metrics_data:
-                        # Check if the result contains an error message
-                        if "error" in str(metrics_data).lower() or "500" in str(metrics_data):
-                            print(f"❌ Metrics agent returned error result, retrying in 4 seconds...")
-                            await asyncio.sleep(4)
-                            continue
-                        metrics_result = str(metrics_data)
-                        print(f"✅ Metrics agent completed successfully after {attempt} attempts!")
-                        break
-                    else:
-                        # The agent is still processing, we need to poll for results
-                        print(f"Metrics agent is processing... Status: {metrics_data.get('status', 'unknown')}")
-                        
-                        # Poll for results indefinitely until we get a result
-                        poll_interval = 4
-                        poll_attempt = 0
-                        
-                        while True:
-                            poll_attempt += 1
-                            print(f"Metrics agent polling attempt {poll_attempt}")
-                            await asyncio.sleep(poll_interval)
-                            
-                            # Make another request to check status
-                            poll_response = await client.post(
-                                "https://metricsagent-739298578243.us-central1.run.app/brand/metrics",
-                                json={"brand_name": brand_name}
-                            )
-                            poll_response.raise_for_status()
-                            poll_data = poll_response.json()
-                            
-                            # Check if research is complete
-                            if poll_data.get("success") and "metrics" in poll_data:
-                                # Check if the result contains an error message
-                                if "error" in str(poll_data).lower() or "500" in str(poll_data):
-                                    print(f"❌ Metrics agent polling returned error result, starting over...")
-                                    break  # Break from polling loop to retry from beginning
-                                metrics_result = str(poll_data)
-                                print(f"✅ Metrics agent completed after {poll_attempt} polling attempts!")
-                                break
-                            elif poll_data.get("status") == "error":
-                                print(f"❌ Metrics agent encountered an error, starting over...")
-                                break  # Break from polling loop to retry from beginning
-                            else:
-                                print(f"Still processing... Status: {poll_data.get('status', 'unknown')}")
-                        
-                        # If we got a successful result from polling, break the main retry loop
-                        if 'metrics_result' in locals():
-                            break
-                        
-                except Exception as e:
-                    print(f"❌ Metrics agent request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-                    continue
-            
-            # Print the metrics result
-            print(f"\n=== METRICS RESULT FOR {brand_name.upper()} ===")
-            print(metrics_result)
-            print("=" * 50)
-            
-            # === 9. BOUNTY AGENT (with 1 minute delay) ===
-            print(f"\n🎯 Step 9: Waiting 1 minute before calling Bounty Agent for {brand_name}...")
-            print("⏰ Waiting 2.5 minutes...")
-            await asyncio.sleep(150)  # Wait for 1 minute
-            
-            print(f"\n🎯 Calling Bounty Agent for {brand_name}...")
-            
-            # Simple retry logic: get bounty data or retry (max 50 attempts)
-            attempt = 0
-            max_attempts = 50
-            bounty_result = None
-            
-            while attempt < max_attempts and bounty_result is None:
-                attempt += 1
-                try:
-                    print(f"Bounty agent attempt {attempt}/{max_attempts}")
-                    bounty_response = await client.get(
-                        "https://bountyagent-739298578243.us-central1.run.app/bounties/auto-generated"
-                    )
-                    bounty_response.raise_for_status()
-                    bounty_data = bounty_response.json()
-                    
-                    # Simple check: if we have success and auto_generated_bounties, use it
-                    if bounty_data.get("success") and bounty_data.get("auto_generated_bounties"):
-                        bounty_result = str(bounty_data)
-                        print(f"✅ Bounty agent completed successfully after {attempt} attempts!")
-                        print(f"📊 Bounty data received: {len(bounty_result)} characters")
-                        break
-                    else:
-                        print(f"❌ Bounty agent not ready yet, retrying in 4 seconds...")
-                        await asyncio.sleep(4)
-                        
-                except Exception as e:
-                    print(f"❌ Bounty agent request failed: {e}, retrying in 4 seconds...")
-                    await asyncio.sleep(4)
-            
-            # If we still don't have bounty data after max attempts, use empty result
-            if bounty_result is None:
-                print(f"❌ Bounty agent failed after {max_attempts} attempts, using empty result")
-                bounty_result = '{"success": false, "error": "Max attempts exceeded", "auto_generated_bounties": {}}'
-            
-            # Print the bounty result
-            print(f"\n=== BOUNTY RESULT FOR {brand_name.upper()} ===")
-            print(bounty_result)
-            print("=" * 50)
-            
-            print(f"\n🎉 ALL STEPS COMPLETED! Preparing final response...")
-            print(f"📊 Response will include:")
-            print(f"   - Web Search: {len(web_search_result)} chars")
-            print(f"   - Negative Reviews: {len(negative_reviews_result)} chars") 
-            print(f"   - Positive Reviews: {len(positive_reviews_result)} chars")
-            print(f"   - Negative Reddit: {len(negative_reddit_result)} chars")
-            print(f"   - Positive Reddit: {len(positive_reddit_result)} chars")
-            print(f"   - Negative Social: {len(negative_social_result)} chars")
-            print(f"   - Positive Social: {len(positive_social_result)} chars")
-            print(f"   - Metrics: {len(metrics_result)} chars")
-            print(f"   - Bounties: {len(bounty_result)} chars")
-            
-            return OrchestratorResponse(
-                brand_name=brand_name,
-                web_search_result=web_search_result,
-                negative_reviews_result=negative_reviews_result,
-                positive_reviews_result=positive_reviews_result,
-                negative_reddit_result=negative_reddit_result,
-                positive_reddit_result=positive_reddit_result,
-                negative_social_result=negative_social_result,
-                positive_social_result=positive_social_result,
-                metrics_result=metrics_result,
-                bounty_result=bounty_result,
-                timestamp=datetime.now().isoformat(),
-                kg_storage_status=kg_storage_status
+                failure = f"still processing after {poll_attempt} polls"
+        except httpx.HTTPStatusError as e:
+            failure = f"HTTP {e.response.status_code}"
+            # Client errors won't fix themselves; timeouts, throttling and server errors might
+            retryable = e.response.status_code >= 500 or e.response.status_code in (408, 429)
+        except (httpx.RequestError, ValueError) as e:
+            failure = f"{type(e).__name__}: {e}"
+        except BaseException:
+            # Cancelled by a deadline, a disconnect or DELETE /jobs: neither a success nor a failure,
+            # but a half-open breaker must not keep waiting on a trial that will never report back
+            breaker.release_trial()
+            raise
+        
+        breaker.record_failure()
+        elapsed = time.monotonic() - started
+        delay = policy.backoff(attempt)
+        if not retryable:
+            raise AgentCallError(stage, f"{label} agent failed: {failure}")
+        if attempt >= policy.max_attempts or elapsed + delay > policy.retry_budget_seconds:
+            raise AgentCallError(stage, f"{label} agent failed after {attempt} attempts in {elapsed:.0f}s: {failure}")
+        print(f"❌ {label} failed ({failure}), retrying in {delay:.1f} seconds...")
+        AGENT_RETRIES.labels(stage).inc()
+        await asyncio.sleep(delay)
+
+class SourceCache:
+    """Results per brand and source, served while fresh and, past their TTL, served stale while a refresh runs."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.stats = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "background_refreshes": 0}
+    
+    def get(self, brand_name, stage):
+        """Return (value, "fresh" | "stale") or (None, "miss")."""
+        key = (normalize_brand_id(brand_name), stage)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None, "miss"
+        
+        value, stored_at = entry
+        age = time.time() - stored_at
+        ttl = AGENTS[stage].get("cache_ttl_seconds", 0)
+        if age <= ttl:
+            self.entries.move_to_end(key)
+            self.stats["fresh_hits"] += 1
+            return value, "fresh"
+        if age <= ttl + AGENTS[stage].get("cache_stale_seconds", 0):
+            self.entries.move_to_end(key)
+            self.stats["stale_hits"] += 1
+            return value, "stale"
+        
+        del self.entries[key]
+        self.stats["misses"] += 1
+        return None, "miss"
+    
+    def set(self, brand_name, stage, value):
+        """Cache a result and return the (value, stored_at) entry it replaced, or None."""
+        key = (normalize_brand_id(brand_name), stage)
+        previous = self.entries.get(key)
+        self.entries[key] = (value, time.time())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return previous
+    
+    def restore(self, brand_name, stage, entry):
+        """Put back an entry returned by set, or drop the key if there was none."""
+        key = (normalize_brand_id(brand_name), stage)
+        if entry is None:
+            self.entries.pop(key, None)
+        else:
+            self.entries[key] = entry
+
+source_cache = SourceCache(int(os.environ.get("SOURCE_CACHE_MAX_ENTRIES", 5000)))
+
+class CheckpointStore:
+    """Unfinished jobs and their finished stages in SQLite, so a restarted orchestrator resumes them."""
+    def __init__(self, path):
+        self.path = path
+        self.db = None
+        if not path:
+            return
+        try:
+            self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, brand_name TEXT NOT NULL, "
+                "use_cache INTEGER NOT NULL, refresh INTEGER NOT NULL, created_at TEXT NOT NULL)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS stages (job_id TEXT NOT NULL, stage TEXT NOT NULL, value TEXT NOT NULL, "
+                "cached INTEGER NOT NULL, finished_at TEXT NOT NULL, PRIMARY KEY (job_id, stage))"
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Could not open checkpoint database {path}, running without checkpoints: {e}")
+            self.db = None
+    
+    def execute(self, sql, params=()):
+        if self.db is None:
+            return []
+        try:
+            return self.db.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"❌ Checkpoint database error: {e}")
+            return []
+    
+    def save_job(self, job):
+        self.execute(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)",
+            (job.job_id, job.brand_name, int(job.use_cache), int(job.refresh), job.created_at.isoformat())
+        )
+    
+    def save_stage(self, job_id, stage, value, cached):
+        self.execute(
+            "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?)",
+            (job_id, stage, value, int(cached), datetime.now(timezone.utc).isoformat())
+        )
+    
+    def delete_job(self, job_id):
+        self.execute("DELETE FROM stages WHERE job_id = ?", (job_id,))
+        self.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+    
+    def load_jobs(self):
+        """Return the unfinished jobs as (job_id, brand_name, use_cache, refresh, created_at, {stage: (value, cached)})."""
+        jobs = []
+        for job_id, brand_name, use_cache, refresh, created_at in self.execute("SELECT * FROM jobs ORDER BY created_at"):
+            stages = {
+                stage: (value, bool(cached))
+                for stage, value, cached in self.execute("SELECT stage, value, cached FROM stages WHERE job_id = ?", (job_id,))
+            }
+            jobs.append((job_id, brand_name, bool(use_cache), bool(refresh), datetime.fromisoformat(created_at), stages))
+        return jobs
+
+# Set CHECKPOINT_DB_PATH to a mounted volume so checkpoints survive container restarts; empty disables them
+checkpoint_store = CheckpointStore(os.environ.get("CHECKPOINT_DB_PATH", "checkpoints.db"))
+
+# Sources being refreshed in the background, and the tasks doing it (kept so they aren't garbage collected)
+refreshing_sources = set()
+background_tasks = set()
+
+# When each (brand_id, kg_key) source was last fetched from its agent, whether or not anything got stored,
+# so the scheduler doesn't keep re-researching brands whose agent returns nothing or keeps failing
+source_attempted_at = {}
+
+def record_source_attempt(brand_name, stage):
+    source_attempted_at[(normalize_brand_id(brand_name), AGENTS[stage]["kg_key"])] = datetime.now(timezone.utc)
+
+async def refresh_source(brand_name, stage):
+    """Re-fetch one stale source and update the cache and the knowledge graph."""
+    agent = AGENTS[stage]
+    try:
+        try:
+            result = await asyncio.wait_for(call_agent(http_client, stage, brand_name), timeout=agent["deadline_seconds"])
+        finally:
+            record_source_attempt(brand_name, stage)
+        source_cache.set(brand_name, stage, result)
+        with KG_OPERATION_DURATION.labels("add_brand_data").time():
+            get_kg_service().add_brand_data(brand_name, {agent["kg_key"]: result})
+        print(f"🔄 Refreshed {agent['label']} for {brand_name} in the background")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"❌ Background refresh of {agent['label']} for {brand_name} failed: {e}")
+    finally:
+        refreshing_sources.discard((normalize_brand_id(brand_name), stage))
+
+def schedule_source_refresh(brand_name, stage):
+    """Start a background refresh for a stale source unless one is already running."""
+    key = (normalize_brand_id(brand_name), stage)
+    if key in refreshing_sources:
+        return
+    refreshing_sources.add(key)
+    source_cache.stats["background_refreshes"] += 1
+    task = asyncio.create_task(refresh_source(brand_name, stage))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def cache_job_result(job, stage, value):
+    """Cache a stage's result, remembering the entry it replaced."""
+    job.cache_previous.setdefault(stage, source_cache.set(job.brand_name, stage, value))
+
+def store_source_in_kg(job, stage, result):
+    """Write one collector's result to the knowledge graph as soon as it arrives."""
+    try:
+        kg = get_kg_service()
+        brand_id = normalize_brand_id(job.brand_name)
+        for key in ("brand_name", AGENTS[stage]["kg_key"]):
+            job.kg_previous.setdefault(key, (kg.brand_atoms.get((brand_id, key), []), kg.updated_at.get((brand_id, key))))
+        with KG_OPERATION_DURATION.labels("add_brand_data").time():
+            kg.add_brand_data(job.brand_name, {AGENTS[stage]["kg_key"]: result})
+        job.kg_stored.add(stage)
+    except Exception as e:
+        print(f"❌ Knowledge Graph storage of {AGENTS[stage]['label']} for {job.brand_name} failed: {e}")
+        job.kg_errors[stage] = str(e)
+
+async def run_collector(client, stage, job, inputs):
+    """Run one collector agent and record its result on the job."""
+    agent = AGENTS[stage]
+    brand_name = job.brand_name
+    started = time.monotonic()
+    
+    if stage in job.results:
+        # Finished before a restart; the knowledge graph went with the old process, so store it again
+        print(f"♻️ {agent['label']} for {brand_name} restored from checkpoint")
+        store_source_in_kg(job, stage, job.results[stage])
+        return job.results[stage]
+    
+    if job.refresh:
+        # Only sources older than their freshness policy are fetched again; the rest are reused from the KG
+        stored, updated_at = get_kg_service().get_source(brand_name, agent["kg_key"])
+        if stored is not None and (datetime.now(timezone.utc) - updated_at).total_seconds() < agent["cache_ttl_seconds"]:
+            print(f"♻️ {agent['label']} for {brand_name} is still fresh (updated {updated_at.isoformat()}), reusing it")
+            REFRESH_SOURCES.labels(stage, "reused").inc()
+            STAGE_DURATION.labels(stage, "cached").observe(time.monotonic() - started)
+            job.cached_stages.add(stage)
+            job.kg_stored.add(stage)
+            job.record_stage(stage, stored)
+            return stored
+        REFRESH_SOURCES.labels(stage, "refetched").inc()
+    elif job.use_cache:
+        cached, freshness = source_cache.get(brand_name, stage)
+        if cached is not None:
+            if freshness == "stale":
+                schedule_source_refresh(brand_name, stage)
+            print(f"⚡ {agent['label']} for {brand_name} served from cache ({freshness})")
+            STAGE_DURATION.labels(stage, "cached").observe(time.monotonic() - started)
+            job.cached_stages.add(stage)
+            # Rewriting an unchanged source would make it look newer than it is
+            if get_kg_service().get_source(brand_name, agent["kg_key"])[0] is None:
+                store_source_in_kg(job, stage, cached)
+            else:
+                job.kg_stored.add(stage)
+            job.record_stage(stage, cached)
+            return cached
+    
+    print(f"\n🚀 Calling {agent['label']} agent for {brand_name}...")
+    
+    try:
+        result = await call_agent(client, stage, brand_name)
+    except AgentCallError as e:
+        record_source_attempt(brand_name, stage)
+        print(f"❌ {e}")
+        STAGE_DURATION.labels(stage, "failed").observe(time.monotonic() - started)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    record_source_attempt(brand_name, stage)
+    print(f"\n=== {agent['label'].upper()} RESULT FOR {brand_name.upper()} ===")
+    print(result)
+    print("=" * 50)
+    STAGE_DURATION.labels(stage, "ok").observe(time.monotonic() - started)
+    cache_job_result(job, stage, result)
+    store_source_in_kg(job, stage, result)
+    job.record_stage(stage, result)
+    return result
+
+# Brands waiting for a bounty callback, keyed by brand id
+bounty_waiters = {}
+
+BOUNTY_CALLBACK_TIMEOUT_SECONDS = float(os.environ.get("BOUNTY_CALLBACK_TIMEOUT_SECONDS", 300))
+BOUNTY_CHECK_INTERVAL_SECONDS = float(os.environ.get("BOUNTY_CHECK_INTERVAL_SECONDS", 30))
+
+def normalize_brand_id(brand_name):
+    """Normalize a brand name the same way the knowledge graph does."""
+    return brand_name.lower().replace(" ", "_")
+
+def register_bounty_waiter(brand_name):
+    """Create a future that resolves when the Bounty Generation Agent calls back for this brand."""
+    waiter = asyncio.get_running_loop().create_future()
+    bounty_waiters.setdefault(normalize_brand_id(brand_name), []).append(waiter)
+    return waiter
+
+def discard_bounty_waiter(brand_name, waiter):
+    """Stop waiting for a bounty callback."""
+    brand_id = normalize_brand_id(brand_name)
+    waiters = bounty_waiters.get(brand_id, [])
+    if waiter in waiters:
+        waiters.remove(waiter)
+    if not waiters:
+        bounty_waiters.pop(brand_id, None)
+
+def format_bounty_result(brand_name, bounties):
+    """Format bounties for one brand the same way /bounties/auto-generated returns them."""
+    return str({
+        "success": True,
+        "auto_generated_bounties": {brand_name: bounties},
+        "total_brands_with_bounties": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "agent_address": bounties.get("agent_address", "")
+    })
+
+async def fetch_brand_bounties(client, brand_name, requested_at):
+    """Look up bounties generated for this brand since requested_at, or None if there are none yet."""
+    try:
+        data = await send_agent_request(client, "bounty", brand_name)
+    except Exception as e:
+        print(f"❌ Bounty agent request failed: {e}")
+        return None
+    
+    if not data.get("success") or not data.get("bounties"):
+        return None
+    
+    # Ignore bounties left over from an earlier run for the same brand
+    try:
+        generated_at = datetime.fromisoformat(data.get("timestamp", ""))
+    except ValueError:
+        return None
+    if generated_at.tzinfo is None:
+        generated_at = generated_at.replace(tzinfo=timezone.utc)
+    if generated_at < requested_at:
+        return None
+    return data
+
+async def wait_for_bounties(client, brand_name, waiter, requested_at):
+    """
+    Wait for the bounty callback, checking the agent directly in case the callback went to another instance.
+    Returns (bounty_result, whether bounties were actually generated).
+    """
+    started = time.monotonic()
+    while True:
+        remaining = BOUNTY_CALLBACK_TIMEOUT_SECONDS - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        try:
+            callback = await asyncio.wait_for(asyncio.shield(waiter), timeout=min(BOUNTY_CHECK_INTERVAL_SECONDS, remaining))
+        except asyncio.TimeoutError:
+            bounties = await fetch_brand_bounties(client, brand_name, requested_at)
+            if bounties:
+                print(f"✅ Bounties for {brand_name} found by direct check after {time.monotonic() - started:.1f}s")
+                return format_bounty_result(brand_name, bounties), True
+            print(f"⏳ Bounties for {brand_name} not ready yet, still waiting...")
+            continue
+        
+        if callback.success:
+            print(f"✅ Bounty callback received for {brand_name} after {time.monotonic() - started:.1f}s")
+            return format_bounty_result(brand_name, callback.bounty_result), True
+        print(f"❌ Bounty agent reported failure for {brand_name}: {callback.error}")
+        return str({"success": False, "error": callback.error or "Bounty generation failed", "auto_generated_bounties": {}}), False
+    
+    print(f"❌ No bounties for {brand_name} after {BOUNTY_CALLBACK_TIMEOUT_SECONDS:.0f} seconds, using empty result")
+    return '{"success": false, "error": "Timed out waiting for bounties", "auto_generated_bounties": {}}', False
+
+async def run_kg_storage_stage(client, stage, job, inputs):
+    """Report how storing the collector results went; each source was stored as soon as its collector finished."""
+    brand_name = job.brand_name
+    print(f"\n🎉 ALL {len(inputs)} SOURCES COLLECTED FOR {brand_name.upper()} in "
+          f"{(datetime.now(timezone.utc) - job.started_at).total_seconds():.1f}s!")
+    if job.kg_errors:
+        kg_storage_status = f"Knowledge Graph storage failed: {'; '.join(job.kg_errors.values())}"
+    else:
+        print(f"✅ Knowledge Graph storage successful for {brand_name}")
+        kg_storage_status = "Successfully stored in Knowledge Graph"
+    job.record_stage("kg_storage", kg_storage_status)
+    return kg_storage_status
+
+async def run_metrics_stage(client, stage, job, inputs):
+    """Run the metrics agent, registering for the bounty callback its analysis triggers."""
+    brand_name = job.brand_name
+    
+    # If every source came from cache nothing new needs analysing, so cached metrics and bounties still hold
+    if (job.use_cache or job.refresh) and job.cached_stages.issuperset(COLLECTOR_STAGES):
+        metrics_result, metrics_freshness = source_cache.get(brand_name, "metrics")
+        bounty_result, bounty_freshness = source_cache.get(brand_name, "bounty")
+        if metrics_freshness == "fresh" and bounty_freshness == "fresh":
+            print(f"⚡ Metrics and bounties for {brand_name} served from cache")
+            job.cached_stages.update(("metrics", "bounty"))
+            job.cached_bounty = bounty_result
+            job.record_stage("metrics", metrics_result)
+            return metrics_result
+    
+    # Register for the bounty callback before the metrics agent kicks off bounty generation.
+    # If metrics finished before a restart, bounties generated since the job was created are ours.
+    metrics_result = job.results.get("metrics")
+    job.bounty_waiter = register_bounty_waiter(brand_name)
+    job.bounty_requested_at = job.created_at if metrics_result is not None else datetime.now(timezone.utc)
+    
+    if metrics_result is not None:
+        print(f"\n♻️ Metrics for {brand_name} restored from checkpoint")
+        return metrics_result
+    
+    print(f"\n📊 Calling Metrics Agent for {brand_name}...")
+    metrics_started = time.monotonic()
+    try:
+        metrics_result = await call_agent(client, "metrics", brand_name)
+    except AgentCallError as e:
+        STAGE_DURATION.labels("metrics", "failed").observe(time.monotonic() - metrics_started)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    STAGE_DURATION.labels("metrics", "ok").observe(time.monotonic() - metrics_started)
+    
+    # Print the metrics result
+    print(f"\n=== METRICS RESULT FOR {brand_name.upper()} ===")
+    print(metrics_result)
+    print("=" * 50)
+    job.record_stage("metrics", metrics_result)
+    return metrics_result
+
+async def run_bounty_stage(client, stage, job, inputs):
+    """Wait for the bounties the metrics agent triggered, notified by callback."""
+    brand_name = job.brand_name
+    
+    if "bounty" in job.cached_stages:
+        bounty_result = job.cached_bounty
+    else:
+        print(f"\n🎯 Waiting for Bounty Agent to generate bounties for {brand_name}...")
+        bounty_started = time.monotonic()
+        try:
+            bounty_result, bounties_generated = await wait_for_bounties(
+                client, brand_name, job.bounty_waiter, job.bounty_requested_at
             )
+        finally:
+            discard_bounty_waiter(brand_name, job.bounty_waiter)
+            job.bounty_waiter = None
+        STAGE_DURATION.labels("bounty", "ok" if bounties_generated else "failed").observe(time.monotonic() - bounty_started)
+        
+        cache_job_result(job, "metrics", inputs["metrics"])
+        if bounties_generated:
+            cache_job_result(job, "bounty", bounty_result)
+    
+    # Print the bounty result
+    print(f"\n=== BOUNTY RESULT FOR {brand_name.upper()} ===")
+    print(bounty_result)
+    print("=" * 50)
+    job.record_stage("bounty", bounty_result)
+    return bounty_result
+
+# What runs each stage of PIPELINE_GRAPH, called as runner(client, stage, job, inputs)
+# where inputs holds the results of the stages it needs
+PIPELINE_STAGE_RUNNERS = {
+    **{stage: run_collector for stage in COLLECTOR_STAGES},
+    "kg_storage": run_kg_storage_stage,
+    "metrics": run_metrics_stage,
+    "bounty": run_bounty_stage,
+}
+
+async def run_stage(client, job, stage, needed):
+    """
+    Wait for the stages this one needs, then run it within its deadline_seconds, if it has one.
+    If a needed stage failed this one is skipped and raises the same error.
+    """
+    inputs = {}
+    for need, task in needed.items():
+        inputs[need] = await task
+    
+    agent = AGENTS.get(stage, {})
+    started = time.monotonic()
+    try:
+        return await asyncio.wait_for(
+            PIPELINE_STAGE_RUNNERS[stage](client, stage, job, inputs),
+            timeout=agent.get("deadline_seconds")
+        )
+    except asyncio.TimeoutError:
+        STAGE_DURATION.labels(stage, "timeout").observe(time.monotonic() - started)
+        print(f"⏰ {agent['label']} agent did not finish within {agent['deadline_seconds']:.0f} seconds")
+        error = HTTPException(
+            status_code=504,
+            detail=f"{agent['label']} agent did not finish within {agent['deadline_seconds']:.0f} seconds"
+        )
+    except HTTPException as e:
+        error = e
+    job.record_failure(stage, str(error.detail))
+    raise error
+
+async def run_stage_graph(client, job):
+    """
+    Start every stage as soon as the stages it needs have finished. A failed stage only skips the stages that
+    need it; the others run to the end, so healthy collectors are still stored, then the first failure is raised.
+    """
+    tasks = {}
+    for stage, needs in PIPELINE_GRAPH.items():
+        tasks[stage] = asyncio.create_task(run_stage(client, job, stage, {need: tasks[need] for need in needs}))
+    try:
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    finally:
+        if job.bounty_waiter is not None:
+            discard_bounty_waiter(job.brand_name, job.bounty_waiter)
+            job.bounty_waiter = None
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return dict(zip(tasks, outcomes))
+
+async def run_research_pipeline(job):
+    """
+    Pipeline that runs the stages of PIPELINE_GRAPH: all 7 collector agents concurrently, storing each
+    result in the knowledge graph as it arrives, then the metrics and bounty agents
+    """
+    brand_name = job.brand_name
+    
+    try:
+        print(f"Starting brand analysis for: {brand_name}")
+        print(f"\n🔍 Running {len(PIPELINE_GRAPH)} pipeline stages for {brand_name}, each as soon as the stages it needs are done...")
+        
+        results = await run_stage_graph(http_client, job)
         
+        print(f"\n🎉 ALL STEPS COMPLETED! Preparing final response...")
+        print(f"📊 Response will include:")
+        for stage in PIPELINE_STAGES:
+            print(f"   - {AGENTS[stage]['label']}: {len(results[stage])} chars")
+        
+        return OrchestratorResponse(
+            brand_name=brand_name,
+            **{f"{stage}_result": results[stage] for stage in PIPELINE_STAGES},
+            timestamp=datetime.now().isoformat(),
+            kg_storage_status=results["kg_storage"],
+            job_id=job.job_id
+        )
+    
+    except HTTPException:
+        raise
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=f"Agent error: {e.response.text}")
     except httpx.RequestError as e:
@@ -892,31 +1611,602 @@ async def research_brand(request: BrandRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+async def run_research_job(job):
+    """Run a queued job and record how it ended."""
+    job.status = "running"
+    job.started_at = datetime.now(timezone.utc)
+    job.publish("job_started", None)
+    print(f"🏃 Job {job.job_id} started for {job.brand_name}")
+    PIPELINES_IN_FLIGHT.inc()
+    try:
+        job.result = await run_research_pipeline(job)
+        job.status = "completed"
+    except HTTPException as e:
+        job.status = "failed"
+        job.error = str(e.detail)
+        job.error_status_code = e.status_code
+    except asyncio.CancelledError:
+        mark_job_cancelled(job)
+        if job.cancel_reason is not None and not CANCELLED_JOBS_KEEP_RESULTS:
+            roll_back_job_writes(job)
+        raise
+    except Exception as e:
+        job.status = "failed"
+        job.error = f"Unexpected error: {str(e)}"
+        job.error_status_code = 500
+    finally:
+        PIPELINES_IN_FLIGHT.dec()
+        finish_research_job(job)
+
+def mark_job_cancelled(job):
+    job.status = "cancelled"
+    job.error = f"Job was cancelled ({job.cancel_reason})" if job.cancel_reason else "Job was cancelled"
+    job.error_status_code = 409
+
+def finish_research_job(job):
+    """Record how a job ended and wake up everyone waiting on it."""
+    job.finished_at = datetime.now(timezone.utc)
+    if job.started_at is not None:
+        duration = (job.finished_at - job.started_at).total_seconds()
+        PIPELINE_DURATION.labels(job.status).observe(duration)
+        if job.status == "completed":
+            admission_stats["average_pipeline_seconds"] += 0.2 * (duration - admission_stats["average_pipeline_seconds"])
+    if job.status == "completed":
+        job.publish("completed", jsonable_encoder(job.result))
+    else:
+        job.publish(job.status, {"error": job.error, "status_code": job.error_status_code})
+    # A job cancelled by shutdown keeps its checkpoint so the next process resumes it
+    if job.status != "cancelled" or job.cancel_reason is not None:
+        checkpoint_store.delete_job(job.job_id)
+    job.done.set()
+    if inflight_jobs.get(job.singleflight_key) is job:
+        del inflight_jobs[job.singleflight_key]
+    print(f"🏁 Job {job.job_id} for {job.brand_name} finished with status: {job.status}")
+
+def roll_back_job_writes(job):
+    """Put back what a cancelled job overwrote in the knowledge graph and the source cache."""
+    kg = get_kg_service()
+    brand_id = normalize_brand_id(job.brand_name)
+    for key, (atoms, updated_at) in job.kg_previous.items():
+        kg.restore_atoms(brand_id, key, atoms, updated_at)
+    for stage, entry in job.cache_previous.items():
+        source_cache.restore(job.brand_name, stage, entry)
+    cancellation_stats["sources_rolled_back"] += len(job.kg_previous) - ("brand_name" in job.kg_previous)
+    print(f"↩️ Rolled back {len(job.kg_previous)} knowledge graph and {len(job.cache_previous)} cache write(s) "
+          f"of cancelled job {job.job_id}")
+
+def cancel_research_job(job, reason):
+    """
+    Cancel a queued or running job. A running pipeline is cancelled as a task, which cancels every stage,
+    agent request, hedge and poll loop in it.
+    """
+    if job.done.is_set() or job.cancel_reason is not None:
+        return
+    job.cancel_reason = reason
+    cancellation_stats[reason] += 1
+    JOBS_CANCELLED.labels(reason).inc()
+    print(f"🛑 Cancelling job {job.job_id} for {job.brand_name} ({reason})")
+    # New requests for the brand start a fresh pipeline instead of joining this one
+    if inflight_jobs.get(job.singleflight_key) is job:
+        del inflight_jobs[job.singleflight_key]
+    if job.task is not None:
+        job.task.cancel()
+    else:
+        mark_job_cancelled(job)
+        finish_research_job(job)
+
+def release_job(job):
+    """A client stopped waiting on a job; cancel it if it disconnected and nobody else wants the result."""
+    job.watchers -= 1
+    if CANCEL_ON_DISCONNECT and job.watchers == 0 and not job.detached:
+        cancel_research_job(job, "disconnect")
+
+async def watch_job(http_request, job):
+    """Wait for a job to finish while the client stays connected. Returns False if the client disconnected first."""
+    while not job.done.is_set():
+        if await http_request.is_disconnected():
+            print(f"🔌 Client waiting on job {job.job_id} for {job.brand_name} disconnected")
+            return False
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout=DISCONNECT_CHECK_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    return True
+
+async def research_worker(worker_id):
+    """Take jobs off the queue and run them one at a time, each in its own task so it can be cancelled alone."""
+    while True:
+        job = await job_queue.get()
+        try:
+            if job.done.is_set():
+                # Cancelled while it was queued
+                continue
+            job.task = asyncio.create_task(run_research_job(job))
+            try:
+                await asyncio.wait([job.task])
+            except asyncio.CancelledError:
+                job.task.cancel()
+                await asyncio.wait([job.task])
+                raise
+            if not job.done.is_set():
+                # Cancelled before the task got to run
+                mark_job_cancelled(job)
+                finish_research_job(job)
+            elif not job.task.cancelled() and job.task.exception() is not None:
+                print(f"❌ Research worker {worker_id} failed on job {job.job_id}: {job.task.exception()}")
+        finally:
+            job_queue.task_done()
+
+def prune_finished_jobs():
+    """Forget finished jobs older than JOB_RETENTION_SECONDS."""
+    cutoff = datetime.now(timezone.utc).timestamp() - JOB_RETENTION_SECONDS
+    for job_id, job in list(research_jobs.items()):
+        if job.finished_at and job.finished_at.timestamp() < cutoff:
+            del research_jobs[job_id]
+
+def submit_research_job(brand_name, use_cache=True, refresh=False):
+    """
+    Create a job for a brand and put it on the worker queue. If the same brand is already queued or running,
+    return that job instead so concurrent requests share one pipeline. Returns (job, coalesced).
+    Raises QueueFullError if a new pipeline would have to wait behind MAX_QUEUED_JOBS others.
+    """
+    prune_finished_jobs()
+    job = ResearchJob(brand_name, use_cache=use_cache, refresh=refresh)
+    inflight = inflight_jobs.get(job.singleflight_key)
+    if inflight is not None and not inflight.done.is_set():
+        singleflight_stats["requests_joined"] += 1
+        # A joined request skips the agent calls the shared job hasn't made, answered from cache, or given up on yet
+        singleflight_stats["agent_calls_saved"] += sum(
+            1 for stage in PIPELINE_STAGES
+            if stage not in inflight.results and stage not in inflight.cached_stages and stage not in inflight.failed_stages
+        )
+        print(f"🔗 {brand_name} is already being researched, joining job {inflight.job_id}")
+        return inflight, True
+    
+    if job_queue.qsize() >= MAX_QUEUED_JOBS:
+        admission_stats["rejected"] += 1
+        JOBS_REJECTED.inc()
+        retry_after = estimated_retry_after()
+        print(f"🚦 Queue full ({job_queue.qsize()} waiting), turning away {brand_name} for {retry_after}s")
+        raise QueueFullError(f"Research queue is full ({job_queue.qsize()} jobs waiting), retry in {retry_after} seconds", retry_after)
+    
+    admission_stats["admitted"] += 1
+    research_jobs[job.job_id] = job
+    inflight_jobs[job.singleflight_key] = job
+    singleflight_stats["pipelines_started"] += 1
+    checkpoint_store.save_job(job)
+    job_queue.put_nowait(job)
+    print(f"📥 Queued job {job.job_id} for {brand_name} ({job_queue.qsize()} job(s) waiting)")
+    return job, False
+
+def resume_checkpointed_jobs():
+    """Queue the jobs a previous process left unfinished, with the stages they had already finished."""
+    for job_id, brand_name, use_cache, refresh, created_at, stages in checkpoint_store.load_jobs():
+        job = ResearchJob(brand_name, use_cache=use_cache, refresh=refresh, job_id=job_id)
+        job.created_at = created_at
+        for stage, (value, cached) in stages.items():
+            job.results[stage] = value
+            if cached:
+                job.cached_stages.add(stage)
+        job.detached = True
+        job.publish("job_resumed", {"stages_restored": list(stages)})
+        research_jobs[job.job_id] = job
+        inflight_jobs[job.singleflight_key] = job
+        job_queue.put_nowait(job)
+        print(f"♻️ Resumed job {job.job_id} for {brand_name} with {len(stages)} finished stage(s)")
+
+# Background re-research of every brand in the knowledge graph, so tracked brands stay fresh without manual calls.
+# Opt-in: every instance that runs it spends Exa/Apify quota, so enable it on one instance only
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "false").lower() == "true"
+SCHEDULER_INTERVAL_SECONDS = float(os.environ.get("SCHEDULER_INTERVAL_SECONDS", 60))
+# Scheduled jobs allowed queued or running at once, so refreshes trickle out instead of bursting
+SCHEDULER_CONCURRENCY = int(os.environ.get("SCHEDULER_CONCURRENCY", 1))
+# Don't schedule the same brand again within this long, even if its last run failed
+SCHEDULER_BRAND_COOLDOWN_SECONDS = float(os.environ.get("SCHEDULER_BRAND_COOLDOWN_SECONDS", 1800))
+# UTC hour ranges to run in, e.g. "22-6,12-13"; empty means any time
+SCHEDULER_OFF_PEAK_HOURS = os.environ.get("SCHEDULER_OFF_PEAK_HOURS", "")
+# Business importance per brand, e.g. {"nike": 3}; brands not listed weigh 1
+BRAND_IMPORTANCE = {normalize_brand_id(name): float(weight) for name, weight in json.loads(os.environ.get("BRAND_IMPORTANCE", "{}")).items()}
+# How overdue a source that was never stored (nor fetched by this process) counts as, relative to its freshness policy
+MISSING_SOURCE_STALENESS = 10.0
+
+scheduled_jobs = set()
+last_scheduled_at = {}
+scheduler_state = {"last_run": None, "due_brands": 0}
+
+def parse_hour_windows(spec):
+    """Parse "22-6,12-13" into [(22, 6), (12, 13)]; a window whose start is after its end wraps past midnight."""
+    windows = []
+    for part in spec.split(","):
+        if part.strip():
+            start, end = part.split("-")
+            windows.append((int(start), int(end)))
+    return windows
+
+scheduler_windows = parse_hour_windows(SCHEDULER_OFF_PEAK_HOURS)
+
+def in_off_peak_window(now):
+    if not scheduler_windows:
+        return True
+    for start, end in scheduler_windows:
+        if (start <= now.hour < end) if start < end else (now.hour >= start or now.hour < end):
+            return True
+    return False
+
+def brand_staleness(brand_name, now):
+    """
+    How overdue the stalest source of a brand is, as age over its freshness policy (1.0 = just due).
+    Age counts from the last fetch attempt when that is newer than the stored data, so a source that came back
+    empty or failed waits a full freshness period before it triggers the brand again.
+    """
+    brand_id = normalize_brand_id(brand_name)
+    staleness = 0.0
+    for stage in COLLECTOR_STAGES:
+        agent = AGENTS[stage]
+        key = (brand_id, agent["kg_key"])
+        checked_at = [at for at in (get_kg_service().updated_at.get(key), source_attempted_at.get(key)) if at is not None]
+        if not checked_at:
+            staleness = max(staleness, MISSING_SOURCE_STALENESS)
+        else:
+            staleness = max(staleness, (now - max(checked_at)).total_seconds() / agent["cache_ttl_seconds"])
+    return staleness
+
+def schedule_due_brands():
+    """Queue refresh-mode jobs for the most overdue, most important brands, within the scheduler's budget."""
+    now = datetime.now(timezone.utc)
+    scheduler_state["last_run"] = now.isoformat()
+    scheduled_jobs.difference_update([job for job in scheduled_jobs if job.done.is_set()])
+    
+    with KG_OPERATION_DURATION.labels("get_all_brands").time():
+        brands = get_kg_service().get_all_brands()
+    queue = []
+    for brand_name in brands:
+        staleness = brand_staleness(brand_name, now)
+        if staleness >= 1:
+            priority = staleness * BRAND_IMPORTANCE.get(normalize_brand_id(brand_name), 1.0)
+            heapq.heappush(queue, (-priority, brand_name))
+    scheduler_state["due_brands"] = len(queue)
+    SCHEDULER_DUE_BRANDS.set(len(queue))
+    
+    if not in_off_peak_window(now):
+        return
+    budget = SCHEDULER_CONCURRENCY - len(scheduled_jobs)
+    while queue and budget > 0:
+        priority, brand_name = heapq.heappop(queue)
+        brand_id = normalize_brand_id(brand_name)
+        if now.timestamp() - last_scheduled_at.get(brand_id, 0) < SCHEDULER_BRAND_COOLDOWN_SECONDS:
+            continue
+        try:
+            job, coalesced = submit_research_job(brand_name, use_cache=True, refresh=True)
+        except QueueFullError:
+            # Interactive traffic comes first; try again next run
+            return
+        last_scheduled_at[brand_id] = now.timestamp()
+        job.detached = True
+        if coalesced:
+            continue
+        scheduled_jobs.add(job)
+        SCHEDULER_RUNS.inc()
+        budget -= 1
+        print(f"🗓️ Scheduled refresh of {brand_name} (priority {-priority:.2f}), job {job.job_id}")
+
+async def run_scheduler():
+    """Look for stale brands every SCHEDULER_INTERVAL_SECONDS."""
+    print(f"🗓️ Scheduler started (every {SCHEDULER_INTERVAL_SECONDS:.0f}s, {SCHEDULER_CONCURRENCY} job(s) at a time, "
+          f"hours: {SCHEDULER_OFF_PEAK_HOURS or 'any'})")
+    while True:
+        await asyncio.sleep(SCHEDULER_INTERVAL_SECONDS)
+        try:
+            schedule_due_brands()
+        except Exception as e:
+            print(f"❌ Scheduler run failed: {e}")
+
+@app.post("/research-brand", status_code=202)
+async def research_brand(request: BrandRequest, http_request: Request, wait: bool = False):
+    """
+    Queue brand research and return a job id right away. Poll GET /jobs/{job_id} for progress.
+    With ?wait=true the request blocks until the pipeline finishes and returns the full OrchestratorResponse.
+    With deadline_seconds it waits at most that long, then returns the stages finished so far with partial=true
+    and the rest in missing_stages; the job keeps running and stores them in the knowledge graph as they finish.
+    A collector that fails is listed in failed_stages and missing_stages instead of failing the deadline request.
+    If a waiting client disconnects and no one else wants the result, the job is cancelled (CANCEL_ON_DISCONNECT).
+    """
+    if request.deadline_seconds is not None and request.deadline_seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be positive")
+    job, coalesced = admit_research_job(request.brand_name, use_cache=request.use_cache, refresh=request.refresh)
+    
+    if request.deadline_seconds is None and not wait:
+        job.detached = True
+        return JobSubmission(
+            job_id=job.job_id,
+            brand_name=job.brand_name,
+            status=job.status,
+            status_url=f"/jobs/{job.job_id}",
+            coalesced=coalesced
+        )
+    
+    job.watchers += 1
+    try:
+        connected = await asyncio.wait_for(watch_job(http_request, job), timeout=request.deadline_seconds)
+    except asyncio.TimeoutError:
+        # The job keeps filling in the missing stages after we answer
+        job.detached = True
+        response = job.partial_response()
+        print(f"⏰ Deadline passed for {job.brand_name}, returning partial results (missing: {', '.join(response.missing_stages)})")
+        return JSONResponse(content=jsonable_encoder(response))
+    finally:
+        release_job(job)
+    
+    if not connected:
+        # Nobody is listening, but the server still needs a response to send
+        return Response(status_code=499)
+    if request.deadline_seconds is not None and job.status == "failed" and job.failed_stages and job.results:
+        # Deadline callers asked for whatever is ready, so a failed collector leaves a gap rather than an error
+        response = job.partial_response()
+        print(f"⚠️ {job.brand_name} finished with failed stages, returning partial results (missing: {', '.join(response.missing_stages)})")
+        return JSONResponse(content=jsonable_encoder(response))
+    if job.status != "completed":
+        raise HTTPException(status_code=job.error_status_code or 500, detail=job.error)
+    return JSONResponse(content=jsonable_encoder(job.result))
+
+@app.post("/research-brand/stream")
+async def research_brand_stream(request: BrandRequest, stream_format: str = Query("ndjson", alias="format")):
+    """
+    Start (or join) research for a brand and stream a typed event per stage as soon as it finishes,
+    e.g. web_search_result, negative_reviews_result, kg_storage, metrics_result, then completed or failed.
+    Use ?format=ndjson (default) or ?format=sse.
+    """
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    job, coalesced = admit_research_job(request.brand_name, use_cache=request.use_cache, refresh=request.refresh)
+    
+    async def event_stream():
+        # The stream is cancelled when the client disconnects, which releases the job
+        job.watchers += 1
+        try:
+            async for event in job.iter_events(heartbeat_seconds=STREAM_HEARTBEAT_SECONDS):
+                if stream_format == "sse":
+                    yield ": keep-alive\n\n" if event is None else f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                else:
+                    yield json.dumps(event if event is not None else {"event": "heartbeat"}) + "\n"
+        finally:
+            release_job(job)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream" if stream_format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": job.job_id}
+    )
+
+# Pipelines all batch requests together may have queued or running, so bulk onboarding leaves room for single requests
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", max(1, RESEARCH_WORKERS - 1)))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 500))
+batch_slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+async def run_batch_brand(brand_name, use_cache, refresh, finished):
+    """Research one brand of a batch once a batch slot is free, then hand the finished job to the stream."""
+    async with batch_slots:
+        while True:
+            try:
+                job, coalesced = submit_research_job(brand_name, use_cache=use_cache, refresh=refresh)
+                break
+            except QueueFullError as e:
+                # Batches aren't interactive, so they wait their turn instead of failing
+                await asyncio.sleep(e.retry_after_seconds)
+        job.watchers += 1
+        try:
+            await job.done.wait()
+        finally:
+            release_job(job)
+    await finished.put((job, coalesced))
+
+def admit_research_job(brand_name, use_cache=True, refresh=False):
+    """submit_research_job for request handlers: a full queue becomes 429 with a Retry-After header."""
+    try:
+        return submit_research_job(brand_name, use_cache=use_cache, refresh=refresh)
+    except QueueFullError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after_seconds)})
+
+def batch_brand_event(job, coalesced):
+    event = {
+        "event": "brand_completed" if job.status == "completed" else "brand_failed",
+        "brand_name": job.brand_name,
+        "job_id": job.job_id,
+        "coalesced": coalesced,
+        "cached_stages": sorted(job.cached_stages),
+    }
+    if job.status == "completed":
+        event["result"] = jsonable_encoder(job.result)
+    else:
+        event["error"] = job.error
+        event["status_code"] = job.error_status_code
+    return event
+
+@app.post("/research-brands")
+async def research_brands(request: BatchResearchRequest):
+    """
+    Research many brands, at most BATCH_MAX_CONCURRENCY at a time across all batches, with each agent's
+    max_concurrency applied on top. Streams one NDJSON line per brand as it finishes, then batch_completed.
+    """
+    # Research each brand once, keeping the order they were given in
+    brand_names = []
+    seen = set()
+    for name in request.brand_names:
+        name = name.strip()
+        if name and normalize_brand_id(name) not in seen:
+            seen.add(normalize_brand_id(name))
+            brand_names.append(name)
+    if not brand_names:
+        raise HTTPException(status_code=400, detail="brand_names must contain at least one brand")
+    if len(brand_names) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} brands per batch")
+    
+    async def batch_stream():
+        finished = asyncio.Queue()
+        tasks = [asyncio.create_task(run_batch_brand(name, request.use_cache, request.refresh, finished)) for name in brand_names]
+        print(f"📦 Batch of {len(brand_names)} brands started")
+        succeeded = 0
+        try:
+            yield json.dumps({"event": "batch_started", "brands": brand_names}) + "\n"
+            for _ in brand_names:
+                while True:
+                    try:
+                        job, coalesced = await asyncio.wait_for(finished.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                        break
+                    except asyncio.TimeoutError:
+                        yield json.dumps({"event": "heartbeat"}) + "\n"
+                succeeded += job.status == "completed"
+                yield json.dumps(batch_brand_event(job, coalesced)) + "\n"
+            yield json.dumps({
+                "event": "batch_completed",
+                "total": len(brand_names),
+                "succeeded": succeeded,
+                "failed": len(brand_names) - succeeded
+            }) + "\n"
+            print(f"📦 Batch of {len(brand_names)} brands finished: {succeeded} succeeded")
+        finally:
+            # If the client goes away, brands not yet submitted are dropped and submitted ones are released
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        batch_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Get the status and partial results of a research job."""
+    job = research_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_status()
+
+@app.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job and all of its agent calls. Finished jobs are returned as they are."""
+    job = research_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    cancel_research_job(job, "api")
+    await job.done.wait()
+    return job.to_status()
+
+@app.get("/scheduler")
+async def get_scheduler():
+    """Background scheduler settings and what it is currently doing."""
+    return {
+        "enabled": SCHEDULER_ENABLED,
+        "interval_seconds": SCHEDULER_INTERVAL_SECONDS,
+        "concurrency": SCHEDULER_CONCURRENCY,
+        "off_peak_hours": SCHEDULER_OFF_PEAK_HOURS or None,
+        "in_off_peak_window": in_off_peak_window(datetime.now(timezone.utc)),
+        "last_run": scheduler_state["last_run"],
+        "due_brands": scheduler_state["due_brands"],
+        "running": [{"job_id": job.job_id, "brand_name": job.brand_name, "status": job.status}
+                    for job in scheduled_jobs if not job.done.is_set()]
+    }
+
+@app.post("/callbacks/bounties")
+async def bounty_callback(callback: BountyCallback):
+    """Called by the Bounty Generation Agent once bounties for a brand are stored."""
+    waiters = bounty_waiters.pop(normalize_brand_id(callback.brand_name), [])
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.set_result(callback)
+    print(f"📬 Bounty callback for {callback.brand_name} (success={callback.success}), notified {len(waiters)} pipeline(s)")
+    return {"status": "received", "waiters_notified": len(waiters)}
+
+# KG query responses are large text blobs that agents fetch over and over, so they carry an ETag built from the
+# brand's data version, are gzipped, and keep their encoded bodies until the data changes
+KG_GZIP_MIN_BYTES = int(os.environ.get("KG_GZIP_MIN_BYTES", 1024))
+KG_GZIP_LEVEL = int(os.environ.get("KG_GZIP_LEVEL", 6))
+KG_RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("KG_RESPONSE_CACHE_MAX_ENTRIES", 256))
+kg_response_cache = OrderedDict()
+
+def kg_etag(*parts):
+    """Weak ETag (the same data may be sent gzipped or not) for one version of a KG query."""
+    return 'W/"' + hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20] + '"'
+
+def kg_json_response(request, etag, build_content):
+    """
+    Answer a KG query: 304 if the client's If-None-Match already has this version, otherwise the orjson-encoded
+    (and, if accepted, gzipped) body, reused from kg_response_cache when another client already asked for it.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    key = (etag, use_gzip)
+    if key in kg_response_cache:
+        kg_response_cache.move_to_end(key)
+        body, gzipped = kg_response_cache[key]
+    else:
+        body = orjson.dumps(build_content())
+        gzipped = use_gzip and len(body) >= KG_GZIP_MIN_BYTES
+        if gzipped:
+            body = gzip.compress(body, compresslevel=KG_GZIP_LEVEL)
+        kg_response_cache[key] = (body, gzipped)
+        while len(kg_response_cache) > KG_RESPONSE_CACHE_MAX_ENTRIES:
+            kg_response_cache.popitem(last=False)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Knowledge Graph Query Endpoints
 @app.get("/kg/query_brand_data")
-async def query_brand_data(brand_name: str, data_type: str = None, sentiment: str = None):
+async def query_brand_data(request: Request, brand_name: str, data_type: str = None, sentiment: str = None):
     """Query brand data from the knowledge graph."""
     try:
-        results = kg_service.query_brand_data(brand_name, data_type, sentiment)
-        return {"results": results, "status": "success"}
+        kg = get_kg_service()
+        etag = kg_etag(kg.instance_id, "query_brand_data", brand_name, kg.brand_versions.get(normalize_brand_id(brand_name), 0),
+                       data_type, sentiment)
+        
+        def build_content():
+            with KG_OPERATION_DURATION.labels("query_brand_data").time():
+                return {"results": kg.query_brand_data(brand_name, data_type, sentiment), "status": "success"}
+        
+        return kg_json_response(request, etag, build_content)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/kg/get_brand_summary")
-async def get_brand_summary(brand_name: str):
+async def get_brand_summary(request: Request, brand_name: str):
     """Get comprehensive brand summary from knowledge graph."""
     try:
-        summary = kg_service.get_brand_summary(brand_name)
-        return {"summary": summary, "status": "success"}
+        kg = get_kg_service()
+        etag = kg_etag(kg.instance_id, "get_brand_summary", brand_name, kg.brand_versions.get(normalize_brand_id(brand_name), 0))
+        
+        def build_content():
+            with KG_OPERATION_DURATION.labels("get_brand_summary").time():
+                return {"summary": kg.get_brand_summary(brand_name), "status": "success"}
+        
+        return kg_json_response(request, etag, build_content)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/kg/get_source_freshness")
+async def get_source_freshness(brand_name: str):
+    """Get when each source of a brand was last updated in the knowledge graph."""
+    try:
+        return {"brand_name": brand_name, "updated_at": get_kg_service().get_source_freshness(brand_name), "status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/kg/get_all_brands")
-async def get_all_brands():
+async def get_all_brands(request: Request):
     """Get all brands in the knowledge graph."""
     try:
-        brands = kg_service.get_all_brands()
-        return {"brands": brands, "status": "success"}
+        kg = get_kg_service()
+        
+        def build_content():
+            with KG_OPERATION_DURATION.labels("get_all_brands").time():
+                return {"brands": kg.get_all_brands(), "status": "success"}
+        
+        return kg_json_response(request, kg_etag(kg.instance_id, "get_all_brands", kg.version), build_content)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -926,24 +2216,58 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
-
-# Create ngrok tunnel
-# public_url = ngrok.connect(8000)
-print(f"🚀 Brand Research Orchestrator with Knowledge Graph is now accessible at:")
-print(f"   Local: http://localhost:8080")
-# print(f"   Public: {public_url}")
-print(f"\n📋 Available endpoints:")
-print(f"   - POST http://localhost:8080/research-brand")
-print(f"   - GET  http://localhost:8080/kg/query_brand_data")
-print(f"   - GET  http://localhost:8080/kg/get_brand_summary")
-print(f"   - GET  http://localhost:8080/kg/get_all_brands")
-print(f"   - GET  http://localhost:8080/health")
-# print(f"\n🔗 External agents can use the public URL to access the knowledge graph!")
-
-# Run the server using nest_asyncio to handle the event loop issue
-import nest_asyncio
-nest_asyncio.apply()
-
-import uvicorn
-uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "http_pool": {
+            **http_pool_stats,
+            "connections_reused": max(http_pool_stats["requests"] - http_pool_stats["connections_opened"], 0)
+        },
+        "singleflight": singleflight_stats,
+        "source_cache": {**source_cache.stats, "entries": len(source_cache.entries)},
+        "rate_limits": {stage: bucket.stats() for stage, bucket in rate_limits.items()},
+        "polling": {
+            stage: {"samples": len(times), "expected_completion_seconds": expected_completion(stage)}
+            for stage, times in completion_times.items() if times
+        },
+        "hedging": {stage: {**stats, "delay_seconds": hedge_delay(stage)} for stage, stats in hedge_stats.items() if hedge_policies[stage]["enabled"]},
+        "admission": {
+            **admission_stats,
+            "queued": job_queue.qsize(),
+            "max_queued": MAX_QUEUED_JOBS,
+            "workers": RESEARCH_WORKERS,
+            "retry_after_seconds": estimated_retry_after()
+        },
+        "cancellation": {
+            **cancellation_stats,
+            "cancel_on_disconnect": CANCEL_ON_DISCONNECT,
+            "keep_results": CANCELLED_JOBS_KEEP_RESULTS
+        }
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: per-stage and per-request agent latency, retries, polls, pipelines and KG timings."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def print_banner():
+    port = os.environ.get("PORT", 8080)
+    print(f"🚀 Brand Research Orchestrator with Knowledge Graph is now accessible at:")
+    print(f"   Local: http://localhost:{port}")
+    print(f"\n📋 Available endpoints:")
+    print(f"   - POST http://localhost:{port}/research-brand")
+    print(f"   - POST http://localhost:{port}/research-brand/stream")
+    print(f"   - POST http://localhost:{port}/research-brands")
+    print(f"   - GET  http://localhost:{port}/jobs/{{job_id}}")
+    print(f"   - GET  http://localhost:{port}/scheduler")
+    print(f"   - POST http://localhost:{port}/callbacks/bounties")
+    print(f"   - GET  http://localhost:{port}/kg/query_brand_data")
+    print(f"   - GET  http://localhost:{port}/kg/get_brand_summary")
+    print(f"   - GET  http://localhost:{port}/kg/get_source_freshness")
+    print(f"   - GET  http://localhost:{port}/kg/get_all_brands")
+    print(f"   - GET  http://localhost:{port}/health")
+    print(f"   - GET  http://localhost:{port}/metrics")
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
@@ -0,0 +1,94 @@
+"""
+Profile orchestrator cold start.
+
+Prints the slowest imports in the `import main` chain (from python -X importtime), then starts the server
+a few times and measures time to the first successful /health response and to the first knowledge graph
+request, which is when the KG gets built.
+
+    python profile_startup.py --top 20 --runs 3
+"""
+import subprocess
+import argparse
+import statistics
+import httpx
+import time
+import sys
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def profile_imports(top, env):
+    """Return (total import seconds, [(cumulative seconds, self seconds, module)]) for `import main`."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=HERE, env=env, capture_output=True, text=True
+    )
+    imports = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        imports.append((int(cumulative_us) / 1e6, int(self_us) / 1e6, module.rstrip()))
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+        raise SystemExit("import main failed")
+    # Top-level modules (no leading spaces) add up to the whole import
+    total = sum(cumulative for cumulative, _, module in imports if not module.startswith(" "))
+    return total, sorted(imports, reverse=True)[:top]
+
+def wait_for(client, url, started, timeout_seconds):
+    while time.monotonic() - started < timeout_seconds:
+        try:
+            if client.get(url).status_code == 200:
+                return time.monotonic() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} did not answer within {timeout_seconds} seconds")
+
+def time_cold_start(port, env, timeout_seconds):
+    """Start main.py and return (seconds to first /health, seconds for the first KG request)."""
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=HERE, env={**env, "PORT": str(port)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(timeout=timeout_seconds) as client:
+            first_request = wait_for(client, f"http://localhost:{port}/health", started, timeout_seconds)
+            kg_started = time.monotonic()
+            client.get(f"http://localhost:{port}/kg/get_all_brands").raise_for_status()
+            return first_request, time.monotonic() - kg_started
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile orchestrator import time and time to first request.")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    # Keep the profile to startup itself: no scheduler, no checkpoint resumes
+    env = {**os.environ, "SCHEDULER_ENABLED": "false", "CHECKPOINT_DB_PATH": ""}
+
+    total, slowest = profile_imports(args.top, env)
+    print(f"📦 import main: {total:.3f}s")
+    print(f"{'cumulative s':>13} {'self s':>8}  module")
+    for cumulative, self_seconds, module in slowest:
+        print(f"{cumulative:13.3f} {self_seconds:8.3f}  {module}")
+
+    first_requests, kg_requests = [], []
+    for run in range(args.runs):
+        first_request, kg_request = time_cold_start(args.port, env, args.timeout)
+        print(f"🚀 Run {run + 1}: first /health after {first_request:.3f}s, first KG request took {kg_request:.3f}s")
+        first_requests.append(first_request)
+        kg_requests.append(kg_request)
+    print(f"\n⏱️ Median time to first request: {statistics.median(first_requests):.3f}s, "
+          f"first KG request: {statistics.median(kg_requests):.3f}s")
+
+if __name__ == "__main__":
+    main()
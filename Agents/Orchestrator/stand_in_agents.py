@@ -0,0 +1,187 @@
+"""
+Local stand-ins for every agent in the registry, so the orchestrator can run and be load tested offline.
+
+Each agent answers on the path from its registry URL after a log-normal delay, and can be set to fail or to
+report "processing" for a while before finishing, through the "stand_in" settings in agents.local.json.
+The metrics stand-in also generates bounties in the background and calls the orchestrator back, like the
+real Metrics and Bounty Generation agents do.
+
+    python stand_in_agents.py
+    AGENT_REGISTRY_PATH=agents.local.json python main.py
+"""
+from fastapi import FastAPI, HTTPException, Request
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import httpx
+import asyncio
+import random
+import json
+import math
+import time
+import os
+
+REGISTRY_PATH = os.environ.get("AGENT_REGISTRY_PATH", "agents.local.json")
+ORCHESTRATOR_URL = os.environ.get("ORCHESTRATOR_URL", "http://localhost:8080")
+STAND_IN_PORT = int(os.environ.get("STAND_IN_PORT", 8100))
+# Multiplies every latency, e.g. 0.1 for quick smoke runs
+STAND_IN_LATENCY_SCALE = float(os.environ.get("STAND_IN_LATENCY_SCALE", 1))
+# Overrides every agent's error rate when set
+STAND_IN_ERROR_RATE = os.environ.get("STAND_IN_ERROR_RATE")
+
+if os.environ.get("STAND_IN_SEED"):
+    random.seed(int(os.environ["STAND_IN_SEED"]))
+
+DEFAULT_STAND_IN = {
+    "latency_seconds": 1,       # median delay before answering
+    "latency_sigma": 0.5,       # spread of the log-normal delay; 0 always waits exactly latency_seconds
+    "error_rate": 0.0,          # share of requests answered with HTTP 500
+    "failure_rate": 0.0,        # share of requests answered with a retryable "failed" status
+    "processing_rate": 0.0,     # share of requests that report "processing" before finishing
+    "processing_seconds": 5,    # median time those requests keep reporting "processing" for (log-normal, latency_sigma)
+    "result_chars": 2000,       # size of the generated result text
+}
+
+app = FastAPI(title="Stand-in Agents", version="1.0.0")
+
+# Brands an agent is still "processing", keyed by (stage, brand id), with when they finish
+processing = {}
+# Bounties generated per brand id, served by the bounty stand-in
+generated_bounties = {}
+# Background bounty generation tasks (kept so they aren't garbage collected)
+background_tasks = set()
+stand_in_stats = {}
+
+def load_registry(path):
+    """Load the agent registry, resolving relative paths against this directory."""
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    with open(path) as f:
+        return json.load(f)
+
+def stand_in_settings(agent):
+    settings = {**DEFAULT_STAND_IN, **agent.get("stand_in", {})}
+    if STAND_IN_ERROR_RATE is not None:
+        settings["error_rate"] = float(STAND_IN_ERROR_RATE)
+    return settings
+
+def sample_delay(median, settings):
+    """A log-normal delay around the median, scaled by STAND_IN_LATENCY_SCALE."""
+    return median * math.exp(random.gauss(0, settings["latency_sigma"])) * STAND_IN_LATENCY_SCALE
+
+async def simulate_latency(settings):
+    """Sleep for a log-normal delay around the configured median."""
+    await asyncio.sleep(sample_delay(settings["latency_seconds"], settings))
+
+def sample_text(label, brand_name, chars):
+    sentence = f"{label} finding about {brand_name}: customers mention pricing, support and product quality. "
+    return (sentence * (chars // len(sentence) + 1))[:chars]
+
+def timestamp():
+    return datetime.now(timezone.utc).isoformat()
+
+async def generate_bounties(agent, brand_name):
+    """Generate bounties after the bounty agent's delay and tell the orchestrator, like the real Bounty agent."""
+    settings = stand_in_settings(agent)
+    await simulate_latency(settings)
+    if random.random() < settings["error_rate"]:
+        bounty_result = {"success": False, "brand_name": brand_name, "bounties": [], "analysis_summary": "Stand-in bounty generation failed"}
+    else:
+        bounty_result = {
+            "success": True,
+            "brand_name": brand_name,
+            "bounties": [
+                {"title": f"Improve {brand_name} support response times", "reward": 500},
+                {"title": f"Fix {brand_name} checkout issues", "reward": 750},
+            ],
+            "analysis_summary": f"Stand-in bounties for {brand_name}",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "agent_address": "stand-in:bounty",
+        }
+        generated_bounties[brand_name.lower().replace(" ", "_")] = bounty_result
+
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            await client.post(f"{ORCHESTRATOR_URL}/callbacks/bounties", json={
+                "brand_name": brand_name,
+                "success": bounty_result["success"],
+                "bounty_result": bounty_result,
+                "error": None if bounty_result["success"] else bounty_result["analysis_summary"],
+            })
+    except httpx.HTTPError as e:
+        print(f"❌ Stand-in bounty callback for {brand_name} failed: {e}")
+
+def make_post_handler(stage, agent, bounty_agent):
+    async def handler(request: Request):
+        payload = await request.json()
+        brand_name = payload.get(agent["payload_key"], "")
+        settings = stand_in_settings(agent)
+        stats = stand_in_stats[stage]
+        stats["requests"] += 1
+
+        # Keep answering "processing" until this brand's processing time is up
+        key = (stage, brand_name.lower())
+        if key not in processing and random.random() < settings["processing_rate"]:
+            processing[key] = time.monotonic() + sample_delay(settings["processing_seconds"], settings)
+        if key in processing and time.monotonic() < processing[key]:
+            stats["processing"] += 1
+            return {"success": False, "status": "processing", "retryable": False, "error": "", "brand_name": brand_name,
+                    "timestamp": timestamp()}
+        processing.pop(key, None)
+
+        await simulate_latency(settings)
+        if random.random() < settings["error_rate"]:
+            stats["errors"] += 1
+            raise HTTPException(status_code=500, detail=f"Stand-in {agent['label']} failure")
+        if random.random() < settings["failure_rate"]:
+            stats["failures"] += 1
+            return {"success": False, "status": "failed", "retryable": True, "error": f"Stand-in {agent['label']} upstream failure",
+                    "brand_name": brand_name, agent["result_field"]: "", "timestamp": timestamp(), "agent_address": f"stand-in:{stage}"}
+
+        if agent.get("result_format") == "response":
+            result = {"overall_sentiment": round(random.uniform(-1, 1), 2), "positive_share": round(random.uniform(0, 1), 2)}
+            if bounty_agent is not None:
+                task = asyncio.create_task(generate_bounties(bounty_agent, brand_name))
+                background_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
+        else:
+            result = sample_text(agent["label"], brand_name, settings["result_chars"])
+        return {
+            "success": True,
+            "status": "ok",
+            "retryable": False,
+            "error": "",
+            "brand_name": brand_name,
+            agent["result_field"]: result,
+            "timestamp": timestamp(),
+            "agent_address": f"stand-in:{stage}",
+        }
+    return handler
+
+def make_get_handler(stage, agent):
+    async def handler(brand_name: str):
+        stand_in_stats[stage]["requests"] += 1
+        bounties = generated_bounties.get(brand_name.lower().replace(" ", "_"))
+        if bounties is None:
+            return {"success": False, "brand_name": brand_name, "bounties": [], "analysis_summary": "No bounties generated yet",
+                    "timestamp": timestamp(), "agent_address": f"stand-in:{stage}"}
+        return bounties
+    return handler
+
+registry = load_registry(REGISTRY_PATH)
+for stage, agent in registry.items():
+    stand_in_stats[stage] = {"requests": 0, "errors": 0, "failures": 0, "processing": 0}
+    path = urlparse(agent["url"]).path
+    if agent.get("method", "POST") == "GET":
+        app.add_api_route(path, make_get_handler(stage, agent), methods=["GET"])
+    else:
+        app.add_api_route(path, make_post_handler(stage, agent, registry.get("bounty")), methods=["POST"])
+    print(f"🤖 Stand-in {agent['label']} on {agent.get('method', 'POST')} {path}")
+
+@app.get("/stand-in/stats")
+async def get_stats():
+    """Requests, injected errors and failures, and "processing" answers per stand-in agent."""
+    return stand_in_stats
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=STAND_IN_PORT)